@@ -4,22 +4,53 @@ Created on May 4, 2011
 @author: nickb
 '''
 
+import threading
 import numpy as np
 import pygrib
+import cache
+from functools import wraps
 from File import File
+from GridGeometry import get_geometry, lookup_geometry
+
+
+def _locked(method):
+    # run a GribFile method holding the handle lock
+    @wraps(method)
+    def lockedMethod(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return lockedMethod
 
-PYGRIB_VER = [int(x) for x in pygrib.__version__.split('.')]
 
 class GribFile(File):
     """
     Common interface for (reading) Grib files.
+
+    When a cube cache is enabled (see cache.enable_cube_cache, or pass a
+    cache.DiskCache as cubeCache), the decoded variables and grid geometry
+    of the file are stored in it, and later reads of the same file content
+    are served from read-only memory mapped arrays without opening the file
+    with pygrib.
+
+    Cubes decoded elsewhere (e.g. by a GribPrefetcher) can be handed to the
+    handle with preload, and are then used by the reads instead of decoding
+    the file again, until the handle is closed.
+
+    The read methods hold a per-handle lock, so one GribFile can be shared
+    between threads, and close can be called at any time: a later read
+    reopens the file.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, cubeCache=None):
         File.__init__(self, filename)
         self.inFile = None
+        self.cubeCache = cubeCache
+        self.geometry = None
+        self.preloaded = {}
+        self.lock = threading.RLock()
 
 
+    @_locked
     def readData(self, varName, **kwargs):
         # only reopen the file if it is not already open
         if self.inFile == None:
@@ -42,26 +73,32 @@ class GribFile(File):
         return records
 
 
-    def readDataLatLon(self, varName, lat, lon, **kwargs):
+    @_locked
+    def readDataLatLon(self, varName, lat, lon, horizontal='nearest', **kwargs):
         """Given a measurement name and (lat,lon) coords, return an array 
         containing the measurement values at that (lat,lon) for each 
         pressure level, sorted by pressure level.
+
+        horizontal - 'nearest' grid cell, or 'bilinear' interpolation between
+                     the four surrounding cells, see GridGeometry.sample
         """
-        # TODO: interpolate between lat and lon if necessary
-        
+        if self._getCubeCache() is not None or (not kwargs and varName in self.preloaded):
+            # sample the (cached) cube instead of decoding every record
+            coordGrid, presVec, dataGrid = self.readDataAllLatLon(varName, **kwargs)
+            dataVec = self.getGeometry().sample(dataGrid, lat, lon, horizontal)[:, 0]
+            return np.array(presVec), dataVec
+
         retList = []
         
         records = self._readRecords(varName, **kwargs)
-
-        # get the index of the (lat,lon) pair
-        lats, lons = records[0].latlons()   
-        latIdx, lonIdx = self._getIndex(lats, lons, lat, lon)
+        geometry = self.getGeometry(records[0])
 
         for record in records:
             # We only care about the pressure levels
             if record.typeOfLevel == 'isobaricInhPa':
                 # Append this value as a 2D 1x1 grid, NOTE: right now, just a value
-                retList.append((record.level, record.values[latIdx][lonIdx]))
+                value = geometry.sample(record.values, lat, lon, horizontal)[0]
+                retList.append((record.level, value))
 
         retList.sort()
 
@@ -74,6 +111,7 @@ class GribFile(File):
         return presVec, dataVec
 
 
+    @_locked
     def readDataAllLatLon(self, varName, **kwargs):
         """Read a measurement at all (lat,lon) coords in this file. Return one
         grid with the coordinate mappings, and one grid with the profiles which
@@ -89,12 +127,15 @@ class GribFile(File):
                     themselves. profGrid is indexed by:
                     (pressure level, latIdx, lonIdx)
         """
+        cached = self._readCachedCubes([varName], kwargs)
+        if varName in cached:
+            presVec, dataGrid = cached[varName]
+            return self.geometry.coordGrid.copy(), presVec, dataGrid
 
         records = self._readRecords(varName, **kwargs)
 
         # get all the valid (lat,lon) pairs and store them into coordGrid
-        lats, lons = records[0].latlons()
-        coordGrid = self._getLatLonGrid(lats, lons)
+        coordGrid = self.getGeometry(records[0]).coordGrid.copy()
 
         # get profiles and sort by pressure level
         tmpGrid = []
@@ -103,6 +144,120 @@ class GribFile(File):
                 # store our 3D profile grid as a numpy.ndarray
                 tmpGrid.append((record.level, record.values))
 
+        presVec, dataGrid = self._stackLevels(tmpGrid, coordGrid)
+        self._cacheCubes({varName: (presVec, dataGrid)}, kwargs)
+        return coordGrid, presVec, dataGrid
+
+
+    @_locked
+    def readVariables(self, varNames, **kwargs):
+        """Read several measurements at all (lat,lon) coords in one sequential
+        pass over the file. Only pressure level messages of the requested
+        measurements are decoded; kwargs are extra header key filters, as for
+        select.
+
+        in:
+        varNames - The names of the measurements for which to get the profiles
+
+        out:
+        dict mapping each name in varNames to its (coordGrid, presVec,
+        profGrid), see readDataAllLatLon
+        """
+        cached = self._readCachedCubes(varNames, kwargs)
+        if len(cached) == len(varNames):
+            retDict = {}
+            for varName in varNames:
+                presVec, dataGrid = cached[varName]
+                retDict[varName] = (self.geometry.coordGrid.copy(), presVec, dataGrid)
+            return retDict
+
+        # only reopen the file if it is not already open
+        if self.inFile == None:
+            self.inFile = pygrib.open(self.filename)
+
+        # only decode the variables which are not cached
+        tmpGrids = dict((varName, []) for varName in varNames if varName not in cached)
+        geometry = None
+
+        self.inFile.seek(0)
+        for record in self.inFile:
+            # check the header keys before decoding anything
+            if record.typeOfLevel != 'isobaricInhPa':
+                continue
+
+            if record.indicatorOfParameter == 154:
+                varName = "O3MR"
+            else:
+                varName = record.name
+
+            if varName not in tmpGrids:
+                continue
+
+            skip = False
+            for key, value in kwargs.items():
+                if record[key] != value:
+                    skip = True
+                    break
+            if skip:
+                continue
+
+            if geometry is None:
+                geometry = self.getGeometry(record)
+            tmpGrids[varName].append((record.level, record.values))
+
+        for varName in tmpGrids:
+            if len(tmpGrids[varName]) == 0:
+                raise ValueError('no matches found for %s' % varName)
+
+        # all variables share the grid
+        coordGrid = geometry.coordGrid.copy()
+
+        decoded = {}
+        for varName in tmpGrids:
+            decoded[varName] = self._stackLevels(tmpGrids[varName], coordGrid)
+        self._cacheCubes(decoded, kwargs)
+
+        retDict = {}
+        for varName in varNames:
+            presVec, dataGrid = decoded.get(varName, cached.get(varName))
+            retDict[varName] = (coordGrid, presVec, dataGrid)
+
+        return retDict
+
+
+    @_locked
+    def readVariablesLatLon(self, varNames, lats, lons, horizontal='nearest', **kwargs):
+        """Read several measurements at many (lat,lon) coords, decoding each
+        record only once, see readVariables.
+
+        in:
+        varNames - The names of the measurements for which to get the profiles
+        lats     - latitudes of the points
+        lons     - longitudes of the points
+        horizontal - 'nearest' or 'bilinear', see readDataLatLon
+
+        out:
+        dict mapping each name in varNames to its (presVec, dataGrid), where
+        dataGrid is indexed by (pressure level, point)
+        """
+        lats = np.asarray(lats, dtype='float64').ravel()
+        lons = np.asarray(lons, dtype='float64').ravel()
+
+        cubes = self.readVariables(varNames, **kwargs)
+
+        retDict = {}
+        geometry = self.getGeometry()
+        for varName in varNames:
+            coordGrid, presVec, dataGrid = cubes[varName]
+            retDict[varName] = (presVec, geometry.sample(dataGrid, lats, lons, horizontal))
+
+        return retDict
+
+
+    def _stackLevels(self, tmpGrid, coordGrid):
+        """Sort a list of (level, values) pairs by pressure level and stack them
+        into the pressure vector and (pressure level, latIdx, lonIdx) grid.
+        """
         tmpGrid.sort(key=lambda prof: prof[0])
 
         # copy profiles into our output format
@@ -112,7 +267,7 @@ class GribFile(File):
             presVec[i] = tmpGrid[i][0]
             dataGrid[i] = tmpGrid[i][1]
 
-        return coordGrid, presVec, dataGrid
+        return presVec, dataGrid
 
 
     def _readRecords(self, varName, **kwargs):
@@ -133,45 +288,114 @@ class GribFile(File):
         return records
 
 
-    def _getLatLonGrid(self, lats, lons):
-        """Given lats and lons objects from pygrib, return the grid of (lat,lon) 
-        pairs corresponding to the indices of the grid.
+    @_locked
+    def preload(self, cubes, geometry):
+        """Keep already decoded measurements of this file in memory, so the
+        reads use them instead of decoding the file. They are released when
+        the handle is closed.
+
+        in:
+        cubes    - dict mapping measurement names to their (coordGrid, presVec,
+                   profGrid), as returned by readVariables (without kwargs)
+        geometry - GridGeometry of the file
         """
-        numLats, numLons = lats.shape
-
-        #coordGrid = [[0 for lon in range(numLons)] for lat in range(numLats)]
-        coordGrid = np.ndarray((numLats, numLons, 2))
-        for lat in range(len(lats)):
-            for lon in range(len(lons[lat])):
-                # Moved handling of pygrib version hack to _getIndex. Since the
-                # data matches up with the grid ordering given in lats and lons,
-                # we have to maintain that ordering in our created grid.
-                coordGrid[lat, lon, 0] = lats[lat][lon]
-                coordGrid[lat, lon, 1] = lons[lat][lon]
-
-
-        return coordGrid
-
-            
-    def _getIndex(self, lats, lons, lat, lon):
-        numLats, numLons = lats.shape
-
-        # add 1 because the min and max are both inclusive
-        latRange = lats.max() - lats.min() + 1
-        lonRange = lons.max() - lons.min() + 1
-
-        latRes = latRange / float(numLats)
-        lonRes = lonRange / float(numLons)
-            
-        # Make sure the index is an integer.
-        # HACK: deal with a change in pygrib 1.9.6 and 1.9.8 which flips
-        #   the latitude indices in the coordinate grid. Sometime in the 
-        #   future, should probably figure out a less hacky way to do this.
-        if PYGRIB_VER >= [1, 9, 6]:
-            latIndex = int(round((lats.max() - lat) / latRes))
-        else:
-            latIndex = int(round((lat - lats.min()) / latRes))
-        lonIndex = int(round((lon - lons.min()) / lonRes))
+        self.geometry = geometry
+        for varName, (coordGrid, presVec, dataGrid) in cubes.items():
+            self.preloaded[varName] = (presVec, dataGrid)
+
+
+    @_locked
+    def close(self):
+        """Close the pygrib handle of the file, if it is open, and release
+        any preloaded measurements."""
+        if self.inFile is not None:
+            self.inFile.close()
+            self.inFile = None
+        self.preloaded = {}
+
+
+    @_locked
+    def getGeometry(self, record=None):
+        """Return the GridGeometry of a message of this file, by default the
+        first one. Files on the same grid share the instance.
+        """
+        if record is None:
+            if self.geometry is not None or self._readCachedGeometry() is not None:
+                return self.geometry
+
+            # only reopen the file if it is not already open
+            if self.inFile == None:
+                self.inFile = pygrib.open(self.filename)
+            record = self.inFile.message(1)
+
+        self.geometry = get_geometry(record)
+        return self.geometry
+
+
+    def _getCubeCache(self):
+        if self.cubeCache is not None:
+            return self.cubeCache
+        return cache.get_cube_cache()
+
+
+    def _cacheKey(self, *parts):
+        # cache key of something derived from the contents of this file
+        return cache.make_key(cache.file_digest(self.filename, self._getCubeCache()), *parts)
+
+
+    def _readCachedGeometry(self):
+        # restore the geometry from the cube cache, if it is there
+        cubeCache = self._getCubeCache()
+        if cubeCache is None:
+            return None
+
+        entry = cubeCache.get(self._cacheKey('geometry'))
+        if entry is None:
+            return None
+
+        arrays, meta = entry
+        self.geometry = lookup_geometry(meta['key'], arrays['coordGrid'])
+        return self.geometry
+
+
+    def _readCachedCubes(self, varNames, kwargs):
+        # dict of the (presVec, dataGrid) of the varNames which are preloaded
+        # or in the cube cache
+        cached = {}
+        if not kwargs:
+            for varName in varNames:
+                if varName in self.preloaded:
+                    cached[varName] = self.preloaded[varName]
+
+        cubeCache = self._getCubeCache()
+        if cubeCache is None or len(cached) == len(varNames):
+            return cached
+
+        if self.geometry is None and self._readCachedGeometry() is None:
+            return cached
+
+        for varName in varNames:
+            if varName in cached:
+                continue
+            entry = cubeCache.get(self._cacheKey('cube', varName, sorted(kwargs.items())))
+            if entry is not None:
+                arrays, meta = entry
+                cached[varName] = (arrays['presVec'], arrays['dataGrid'])
+
+        return cached
+
+
+    def _cacheCubes(self, cubes, kwargs):
+        # store a dict of decoded (presVec, dataGrid) in the cube cache
+        cubeCache = self._getCubeCache()
+        if cubeCache is None:
+            return
 
-        return (latIndex, lonIndex)
+        geometryKey = self._cacheKey('geometry')
+        if geometryKey not in cubeCache:
+            cubeCache.put(geometryKey, {'coordGrid': self.geometry.coordGrid},
+                          {'key': self.geometry.jsonKey()})
 
+        for varName, (presVec, dataGrid) in cubes.items():
+            cubeCache.put(self._cacheKey('cube', varName, sorted(kwargs.items())),
+                          {'presVec': presVec, 'dataGrid': dataGrid})
@@ -0,0 +1,107 @@
+'''
+Bounded pool of open GribFile handles, reused least recently used first.
+'''
+
+import threading
+from collections import OrderedDict
+from GribFile import GribFile
+
+# number of handles a pool keeps open by default
+DEFAULT_CAPACITY = 4
+
+
+class GribFilePool(object):
+    """
+    Keeps up to capacity GribFile handles open, so that alternating between
+    a few files (e.g. two analysis times) does not reopen and rescan them.
+    When a new file is opened in a full pool, the least recently used handle
+    is closed. The pool is thread safe, and the GribFile read methods lock
+    their handle, so a pool can be shared between threads.
+
+    hits, misses - number of get calls which found / did not find an open
+                   handle
+    evictions    - number of handles closed to make room
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, filename):
+        '''Return the open GribFile of filename, opening it if needed.'''
+        evicted = []
+        with self._lock:
+            grb = self._handles.pop(filename, None)
+            if grb is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                grb = GribFile(filename)
+                while len(self._handles) >= self.capacity:
+                    evicted.append(self._handles.popitem(last=False)[1])
+                    self.evictions += 1
+            # most recently used last
+            self._handles[filename] = grb
+
+        # close outside of the pool lock, waiting for any reads in progress
+        for old in evicted:
+            old.close()
+
+        return grb
+
+
+    def resize(self, capacity):
+        '''Change the capacity, closing the least recently used handles if
+        there are more open.'''
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+
+        evicted = []
+        with self._lock:
+            self.capacity = capacity
+            while len(self._handles) > capacity:
+                evicted.append(self._handles.popitem(last=False)[1])
+                self.evictions += 1
+
+        for old in evicted:
+            old.close()
+
+
+    def discard(self, filename):
+        '''Close the handle of filename, if it is open.'''
+        with self._lock:
+            grb = self._handles.pop(filename, None)
+        if grb is not None:
+            grb.close()
+
+
+    def close(self):
+        '''Close every handle.'''
+        with self._lock:
+            handles = self._handles.values()
+            self._handles = OrderedDict()
+        for grb in handles:
+            grb.close()
+
+
+    def stats(self):
+        '''Return a dict of the hit, miss and eviction counts and the number
+        of open handles.'''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'open': len(self._handles)}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
@@ -0,0 +1,164 @@
+'''
+Sidecar index of the messages of a GRIB file.
+
+The index records the byte offset, length, parameter and level of every
+message. It is built once (by reading the message headers) and stored next
+to the file, or in INDEX_DIR if that is set, e.g. when the GDAS archive is
+read-only. Later reads seek straight to the messages they need and decode
+only those, without scanning the file.
+'''
+
+import os
+import json
+import hashlib
+import numpy as np
+import pygrib
+from tempfile import mkstemp
+from GridGeometry import get_geometry
+
+# where the indices are stored, None to store them next to the GRIB files
+INDEX_DIR = os.environ.get('GDAS_INTERP_INDEX_DIR')
+
+# file name suffix of the indices
+INDEX_SUFFIX = '.gdasidx'
+
+# header keys recorded for every message
+INDEX_KEYS = ['offset', 'totalLength', 'name', 'indicatorOfParameter', 'typeOfLevel', 'level']
+
+
+def index_path(filename):
+    '''Return the path of the sidecar index of a GRIB file.'''
+    if INDEX_DIR is None:
+        return filename + INDEX_SUFFIX
+
+    name = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(INDEX_DIR, name + INDEX_SUFFIX)
+
+
+class GribIndex(object):
+    """
+    Message index of a GRIB file, loaded from its sidecar file if that is
+    up to date, otherwise built from the message headers and saved.
+
+    messages - list of dicts of the INDEX_KEYS of every message
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.messages = self._load()
+        if self.messages is None:
+            self.messages = self._build()
+            self._save()
+
+
+    def _stamp(self):
+        # size and mtime the index is valid for
+        st = os.stat(self.filename)
+        return [st.st_size, st.st_mtime]
+
+
+    def _load(self):
+        try:
+            index = json.load(open(index_path(self.filename)))
+        except (IOError, ValueError):
+            return None
+
+        if index.get('stamp') != self._stamp():
+            return None
+        return index['messages']
+
+
+    def _build(self):
+        messages = []
+        grbs = pygrib.open(self.filename)
+        try:
+            for record in grbs:
+                messages.append(dict((key, record[key]) for key in INDEX_KEYS))
+        finally:
+            grbs.close()
+
+        # plain types for JSON
+        for message in messages:
+            for key, value in message.items():
+                if hasattr(value, 'item'):
+                    message[key] = value.item()
+
+        return messages
+
+
+    def _save(self):
+        path = index_path(self.filename)
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # write to a temporary file first, so readers never see half a file
+            fd, tmpPath = mkstemp(dir=directory, suffix=INDEX_SUFFIX)
+            fp = os.fdopen(fd, 'w')
+            json.dump({'stamp': self._stamp(), 'messages': self.messages}, fp)
+            fp.close()
+            os.rename(tmpPath, path)
+        except (IOError, OSError):
+            # the index still works for this process, it just is not kept
+            pass
+
+
+    def select(self, varName, typeOfLevel='isobaricInhPa'):
+        '''Return the index entries of the messages of a measurement on the
+        given type of level, like GribFile._readRecords.
+        '''
+        if varName == "O3MR":
+            return [ m for m in self.messages
+                     if m['indicatorOfParameter'] == 154 and m['typeOfLevel'] == typeOfLevel ]
+
+        return [ m for m in self.messages
+                 if m['name'] == varName and m['typeOfLevel'] == typeOfLevel ]
+
+
+    def readMessages(self, entries):
+        '''Decode the messages of the given index entries, reading only their
+        bytes. Returns the pygrib messages in the order of the entries.
+        '''
+        records = [None] * len(entries)
+        fp = open(self.filename, 'rb')
+        try:
+            # read in file order
+            order = sorted(range(len(entries)), key=lambda i: entries[i]['offset'])
+            for i in order:
+                fp.seek(entries[i]['offset'])
+                records[i] = pygrib.fromstring(fp.read(entries[i]['totalLength']))
+        finally:
+            fp.close()
+
+        return records
+
+
+    def readVariablesLatLon(self, varNames, lats, lons, horizontal='nearest'):
+        """Read several measurements at many (lat,lon) coords, decoding only
+        their pressure level messages, see GribFile.readVariablesLatLon.
+
+        out:
+        dict mapping each name in varNames to its (presVec, dataGrid), where
+        dataGrid is indexed by (pressure level, point)
+        """
+        lats = np.asarray(lats, dtype='float64').ravel()
+        lons = np.asarray(lons, dtype='float64').ravel()
+
+        retDict = {}
+        for varName in varNames:
+            entries = sorted(self.select(varName), key=lambda m: m['level'])
+            if len(entries) == 0:
+                raise ValueError('no matches found for %s' % varName)
+
+            records = self.readMessages(entries)
+            geometry = get_geometry(records[0])
+
+            presVec = np.array([ m['level'] for m in entries ], dtype='float64')
+            dataGrid = np.empty((len(records), len(lats)))
+            for i, record in enumerate(records):
+                dataGrid[i] = geometry.sample(record.values, lats, lons, horizontal)
+
+            retDict[varName] = (presVec, dataGrid)
+
+        return retDict
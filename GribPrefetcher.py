@@ -0,0 +1,243 @@
+'''
+Read-ahead of GDAS files, so that the next file is decoded while the current
+one is interpolated:
+
+    interp = Interpolator()
+    with GribPrefetcher(files, filePool=interp.pool) as prefetcher:
+        for filename, cubes in prefetcher:
+            result = interp.vert_interp_all(filename, month)
+
+Decoding runs on a background thread, or in a separate process with
+executor='processes' when pygrib holds the GIL for too long. At most depth
+decoded files (and about maxBytes of cubes) wait to be consumed; the reader
+stops until the consumer catches up.
+'''
+
+import os
+import sys
+import threading
+from collections import deque
+import numpy as np
+import parallel
+from GribFile import GribFile
+from GridGeometry import lookup_geometry
+
+# variables read by default, those used by vert_interp_all
+DEFAULT_VARIABLES = ('Temperature', 'Relative humidity', 'O3MR')
+
+# number of decoded files waiting to be consumed
+DEFAULT_DEPTH = 2
+
+# bytes of decoded cubes waiting to be consumed
+DEFAULT_MAX_BYTES = 2 * 2 ** 30
+
+# seconds between checks for interrupts while waiting for a file
+WAIT_INTERVAL = 1.0
+
+
+def _cube_bytes(cubes):
+    # memory taken by the profile grids of a readVariables dict
+    if cubes is None:
+        return 0
+    return sum(dataGrid.nbytes for coordGrid, presVec, dataGrid in cubes.values())
+
+
+def _decode_shared(task):
+    '''Decode the variables of a file in a worker process, and return the
+    descriptions of SharedArray copies of the cubes (see _attach_cubes).
+    '''
+    filename, varNames = task
+
+    grb = GribFile(filename)
+    try:
+        cubes = grb.readVariables(varNames)
+        geometry = grb.getGeometry()
+    finally:
+        grb.close()
+
+    descs = {}
+    for varName, (coordGrid, presVec, dataGrid) in cubes.items():
+        descs[varName] = (list(presVec), parallel.share(dataGrid).desc())
+
+    return descs, parallel.share(geometry.coordGrid).desc(), geometry.jsonKey()
+
+
+def _attach_cubes(descs, coordDesc, key):
+    '''Map the shared cubes of _decode_shared into this process, returning
+    the readVariables dict and the GridGeometry.
+    '''
+    # the buffers are unlinked right away, the mappings keep them alive
+    coordGrid = np.array(parallel.attach(coordDesc))
+    os.unlink(coordDesc[0])
+    geometry = lookup_geometry(key, coordGrid)
+
+    cubes = {}
+    for varName, (presVec, dataDesc) in descs.items():
+        dataGrid = parallel.attach(dataDesc)
+        os.unlink(dataDesc[0])
+        cubes[varName] = (geometry.coordGrid.copy(), np.array(presVec), dataGrid)
+
+    return cubes, geometry
+
+
+class GribPrefetcher(object):
+    """
+    Iterator over the (filename, cubes) of a list of GRIB files, where cubes
+    is the readVariables dict of the file, decoded ahead of time in the
+    background.
+
+    varNames - measurements to decode
+    depth    - number of decoded files that may wait to be consumed
+    maxBytes - bytes of cubes that may wait to be consumed. One file is
+               always read ahead, even if it is larger.
+    executor - 'threads' to decode on a background thread, or 'processes' to
+               decode in a worker process and pass the cubes back in shared
+               memory
+    pool     - parallel.WorkerPool to decode in with 'processes', by default
+               a new single process pool
+    filePool - GribFilePool (e.g. Interpolator.pool) whose handles are given
+               the decoded cubes (see GribFile.preload), so reads of the file
+               through the pool do not decode it again
+
+    Errors raised while decoding a file are raised by the iterator when that
+    file is reached. Close the prefetcher when done, or use it as a context
+    manager, to stop the reader.
+    """
+
+    def __init__(self, filenames, varNames=DEFAULT_VARIABLES, depth=DEFAULT_DEPTH,
+                 maxBytes=DEFAULT_MAX_BYTES, executor='threads', pool=None, filePool=None):
+        if depth < 1:
+            raise ValueError('depth must be at least 1')
+        if executor not in ('threads', 'processes'):
+            raise ValueError('unsupported executor \'%s\'' % executor)
+
+        self.filenames = list(filenames)
+        self.varNames = list(varNames)
+        self.depth = depth
+        self.maxBytes = maxBytes
+        self.filePool = filePool
+
+        self._ownPool = None
+        if executor == 'processes' and pool is None:
+            pool = self._ownPool = parallel.WorkerPool(1)
+        self._pool = pool if executor == 'processes' else None
+
+        # decoded (filename, cubes, geometry, nBytes, excInfo) waiting to be
+        # consumed
+        self._queue = deque()
+        self._queuedBytes = 0
+        self._lastBytes = 0
+        self._stopped = False
+        self._done = False
+        self._cond = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def _hasRoom(self):
+        # one file is always allowed, so a file over maxBytes is still read
+        if len(self._queue) == 0:
+            return True
+        return (len(self._queue) < self.depth and
+                self._queuedBytes + self._lastBytes <= self.maxBytes)
+
+
+    def _decode(self, filename):
+        if self._pool is not None:
+            return _attach_cubes(*self._pool.pool.apply(_decode_shared,
+                                                        ((filename, self.varNames),)))
+
+        grb = GribFile(filename)
+        try:
+            return grb.readVariables(self.varNames), grb.getGeometry()
+        finally:
+            grb.close()
+
+
+    def _run(self):
+        try:
+            for filename in self.filenames:
+                with self._cond:
+                    while not self._stopped and not self._hasRoom():
+                        self._cond.wait()
+                    if self._stopped:
+                        break
+
+                cubes = geometry = excInfo = None
+                try:
+                    cubes, geometry = self._decode(filename)
+                except Exception:
+                    excInfo = sys.exc_info()
+
+                nBytes = _cube_bytes(cubes)
+                with self._cond:
+                    # the next file is assumed to be as large as this one
+                    self._lastBytes = nBytes
+                    if not self._stopped:
+                        self._queue.append((filename, cubes, geometry, nBytes, excInfo))
+                        self._queuedBytes += nBytes
+                    self._cond.notify_all()
+
+                if excInfo is not None:
+                    break
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+
+    def __iter__(self):
+        return self
+
+
+    def next(self):
+        with self._cond:
+            while len(self._queue) == 0 and not self._done:
+                # waiting with a timeout keeps the consumer interruptible
+                self._cond.wait(WAIT_INTERVAL)
+            if len(self._queue) == 0:
+                raise StopIteration
+
+            filename, cubes, geometry, nBytes, excInfo = self._queue.popleft()
+            self._queuedBytes -= nBytes
+            self._cond.notify_all()
+
+        if excInfo is not None:
+            raise excInfo[0], excInfo[1], excInfo[2]
+
+        if self.filePool is not None:
+            self.filePool.get(filename).preload(cubes, geometry)
+
+        return filename, cubes
+
+
+    def stats(self):
+        '''Return a dict of the number and bytes of the decoded files waiting
+        to be consumed.'''
+        with self._cond:
+            return {'queued': len(self._queue), 'bytes': self._queuedBytes}
+
+
+    def close(self):
+        '''Stop the reader and drop the files it has decoded. The file being
+        decoded, if any, is finished first.'''
+        with self._cond:
+            self._stopped = True
+            self._queue.clear()
+            self._queuedBytes = 0
+            self._cond.notify_all()
+        self._thread.join()
+
+        if self._ownPool is not None:
+            self._ownPool.close()
+            self._ownPool = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
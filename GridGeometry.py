@@ -0,0 +1,240 @@
+'''
+Lat/lon geometry of a GRIB grid, shared by all files on the same grid.
+'''
+
+import numpy as np
+
+# grid description keys identifying a geometry, see get_geometry
+GRID_KEYS = ['gridType', 'Ni', 'Nj',
+             'latitudeOfFirstGridPointInDegrees', 'longitudeOfFirstGridPointInDegrees',
+             'latitudeOfLastGridPointInDegrees', 'longitudeOfLastGridPointInDegrees',
+             'iDirectionIncrementInDegrees', 'jDirectionIncrementInDegrees']
+
+# cached GridGeometry instances, see get_geometry
+_geometry_cache = {}
+
+
+class GridGeometry(object):
+    """
+    Coordinates of a regular lat/lon (or gaussian) grid, built once from the
+    2D lats and lons arrays of a GRIB message.
+
+    lats      - latitude of every grid row, in data order
+    lons      - longitude of every grid column, in data order
+    coordGrid - (lat x lon x 2) grid of the (lat,lon) pair of every cell.
+                Read-only, since the geometry is shared between files.
+    flipped   - True if the rows run north to south, as the data says. This
+                replaces the old pygrib version check.
+    periodic  - True if the columns cover the whole globe
+    key       - grid description the instance is cached under, if any
+    """
+
+    def __init__(self, lats, lons):
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+
+        self.lats = lats[:, 0].copy()
+        self.lons = lons[0, :].copy()
+        self.shape = lats.shape
+        self.key = None
+
+        self.coordGrid = np.dstack((lats, lons))
+        self.coordGrid.flags.writeable = False
+
+        self.flipped = len(self.lats) > 1 and self.lats[0] > self.lats[-1]
+
+        # rows in ascending latitude order, for the nearest row search
+        if self.flipped:
+            self._ascLats = self.lats[::-1]
+        else:
+            self._ascLats = self.lats
+
+        numLons = len(self.lons)
+        if numLons > 1:
+            self.lonRes = (self.lons[-1] - self.lons[0]) / float(numLons - 1)
+        else:
+            self.lonRes = 360.0
+        self.periodic = abs(numLons * self.lonRes - 360.0) < 1e-6 * 360.0
+
+
+    def sameGrid(self, other):
+        '''Return True if other has the same rows and columns. Geometries
+        without a key (e.g. of gaussian grids) are not shared between files,
+        so they are compared by their coordinates.'''
+        if other is self:
+            return True
+        if self.key is not None and self.key == other.key:
+            return True
+        return (self.shape == other.shape and np.array_equal(self.lats, other.lats) and
+                np.array_equal(self.lons, other.lons))
+
+
+    def jsonKey(self):
+        '''Return key as a list of plain values, which can be stored as JSON
+        and passed to lookup_geometry, or None.'''
+        if self.key is None:
+            return None
+        return [ getattr(k, 'item', lambda: k)() for k in self.key ]
+
+
+    def _latIndex(self, lats):
+        # nearest row, also correct for the uneven rows of gaussian grids
+        numLats = len(self._ascLats)
+        hi = np.clip(np.searchsorted(self._ascLats, lats), 1, max(numLats - 1, 1))
+        lo = hi - 1
+        useHi = np.abs(self._ascLats[hi] - lats) < np.abs(lats - self._ascLats[lo])
+        idx = np.where(useHi, hi, lo)
+        if self.flipped:
+            idx = numLats - 1 - idx
+        return idx
+
+
+    def _lonOffset(self, lons):
+        # fractional column of each longitude, in either 0-360 or -180-180
+        return np.mod(lons - self.lons[0], 360.0) / self.lonRes
+
+
+    def index(self, lats, lons):
+        """Return the (latIdx, lonIdx) of the grid cell nearest to every
+        (lat,lon) pair. Longitudes may be given as 0-360 or -180-180 whatever
+        the convention of the grid. Scalars give scalar indices.
+        """
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+
+        latIdx = self._latIndex(lats)
+
+        offset = self._lonOffset(lons)
+        lonIdx = np.rint(offset).astype(int)
+        numLons = len(self.lons)
+        if self.periodic:
+            lonIdx = np.mod(lonIdx, numLons)
+        else:
+            # outside the grid, snap to the nearer edge; points west of the
+            # first column wrap around to large offsets
+            west = np.mod(self.lons[0] - lons, 360.0) / self.lonRes
+            east = offset - (numLons - 1)
+            lonIdx = np.where(lonIdx > numLons - 1, np.where(west < east, 0, numLons - 1), lonIdx)
+
+        if latIdx.ndim == 0 and lonIdx.ndim == 0:
+            return (int(latIdx), int(lonIdx))
+        return latIdx, lonIdx
+
+
+    def bilinear(self, lats, lons):
+        """Return the (latIdx, lonIdx, weights) of the four grid cells around
+        every (lat,lon) pair, each shaped (4, N). Longitudes wrap around on
+        global grids. Points beyond the outermost rows (e.g. poleward of the
+        last row of a gaussian grid) or outside a regional grid take the
+        values of the nearest edge.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype='float64')).ravel()
+        lons = np.atleast_1d(np.asarray(lons, dtype='float64')).ravel()
+
+        # bracketing rows, in ascending latitude order
+        numLats = len(self._ascLats)
+        if numLats > 1:
+            hi = np.clip(np.searchsorted(self._ascLats, lats), 1, numLats - 1)
+            lo = hi - 1
+            latFrac = np.clip((lats - self._ascLats[lo]) / (self._ascLats[hi] - self._ascLats[lo]),
+                              0.0, 1.0)
+            if self.flipped:
+                lo = numLats - 1 - lo
+                hi = numLats - 1 - hi
+        else:
+            lo = hi = np.zeros(len(lats), dtype=int)
+            latFrac = np.zeros(len(lats))
+
+        # bracketing columns
+        numLons = len(self.lons)
+        offset = self._lonOffset(lons)
+        west = np.floor(offset).astype(int)
+        lonFrac = offset - west
+        if self.periodic:
+            west = np.mod(west, numLons)
+            east = np.mod(west + 1, numLons)
+        else:
+            outside = west >= numLons - 1
+            edge = self.index(np.zeros(len(lons)), lons)[1]
+            west = np.where(outside, edge, west)
+            east = np.where(outside, edge, west + 1)
+            lonFrac = np.where(outside, 0.0, lonFrac)
+
+        latIdx = np.array([lo, lo, hi, hi])
+        lonIdx = np.array([west, east, west, east])
+        weights = np.array([(1.0 - latFrac) * (1.0 - lonFrac), (1.0 - latFrac) * lonFrac,
+                            latFrac * (1.0 - lonFrac), latFrac * lonFrac])
+
+        return latIdx, lonIdx, weights
+
+
+    def sample(self, dataGrid, lats, lons, horizontal='nearest'):
+        """Return the values of dataGrid, indexed by (..., latIdx, lonIdx), at
+        every (lat,lon) pair as a (..., N) array.
+
+        horizontal - 'nearest' to take the nearest grid cell, or 'bilinear'
+                     to blend the four surrounding cells, see bilinear
+        """
+        dataGrid = np.asarray(dataGrid)
+        lats = np.atleast_1d(np.asarray(lats, dtype='float64')).ravel()
+        lons = np.atleast_1d(np.asarray(lons, dtype='float64')).ravel()
+
+        if horizontal == 'nearest':
+            latIdx, lonIdx = self.index(lats, lons)
+            return dataGrid[..., latIdx, lonIdx]
+
+        elif horizontal == 'bilinear':
+            latIdx, lonIdx, weights = self.bilinear(lats, lons)
+            values = dataGrid[..., latIdx[0], lonIdx[0]] * weights[0]
+            for k in xrange(1, 4):
+                values += dataGrid[..., latIdx[k], lonIdx[k]] * weights[k]
+            return values
+
+        raise ValueError('unsupported horizontal interpolation \'%s\'' % horizontal)
+
+
+def _grid_key(record):
+    # grid description of a message, None if it does not have one
+    key = []
+    for name in GRID_KEYS:
+        if not record.has_key(name):
+            return None
+        key.append(record[name])
+    return tuple(key)
+
+
+def get_geometry(record):
+    '''Return the GridGeometry of a pygrib message. Messages with the same
+    grid description share one cached instance, so the lat/lon arrays are only
+    decoded once per grid.
+    '''
+    key = _grid_key(record)
+    if key is not None and key in _geometry_cache:
+        return _geometry_cache[key]
+
+    lats, lons = record.latlons()
+    geometry = GridGeometry(lats, lons)
+    geometry.key = key
+    if key is not None:
+        _geometry_cache[key] = geometry
+
+    return geometry
+
+
+def lookup_geometry(key, coordGrid):
+    '''Return the cached GridGeometry of a grid description (see
+    GridGeometry.key), building it from a (lat x lon x 2) coord grid if
+    there is none. Used to restore geometries without the GRIB messages.
+    '''
+    if key is not None:
+        key = tuple(key)
+        if key in _geometry_cache:
+            return _geometry_cache[key]
+
+    coordGrid = np.asarray(coordGrid)
+    geometry = GridGeometry(coordGrid[:, :, 0], coordGrid[:, :, 1])
+    geometry.key = key
+    if key is not None:
+        _geometry_cache[key] = geometry
+
+    return geometry
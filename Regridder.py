@@ -0,0 +1,162 @@
+'''
+Horizontal regridding of (levels x lat x lon) cubes onto other grids, such as
+a 0.25 degree equal-angle grid or an instrument L3 grid:
+
+    regridder = Regridder(grb.getGeometry(), targetLats, targetLons)
+    for f in files:
+        coordGrid, pres, dataGrid = vert_interp_grid('Temperature', filename=f)
+        targetGrid = regridder.apply(dataGrid)
+
+The sparse weight matrix of a (source geometry, target grid) pair is built
+once and stored in REGRID_DIR, so later runs load it instead of building it.
+'''
+
+import os
+import hashlib
+import numpy as np
+import scipy.sparse as sparse
+from tempfile import mkstemp
+from GridGeometry import GridGeometry
+
+# where the weight matrices are stored
+REGRID_DIR = os.environ.get('GDAS_INTERP_REGRID_DIR',
+                            os.path.join(os.path.expanduser('~'), '.gdas_interp_regrid'))
+
+# weight matrices loaded or built by this process, by digest
+_weight_cache = {}
+
+
+def _digest(geometry, lats, lons, horizontal):
+    # identifies the weights of a (source geometry, target grid) pair
+    sha = hashlib.sha1()
+    for arr in (geometry.lats, geometry.lons, lats, lons):
+        arr = np.ascontiguousarray(arr, dtype='float64')
+        sha.update(str(arr.shape))
+        sha.update(arr.tostring())
+    sha.update(horizontal)
+    return sha.hexdigest()
+
+
+class Regridder(object):
+    """
+    Sparse (target cell x source cell) weight matrix from a source grid to a
+    target grid.
+
+    geometry   - the source GridGeometry, or a (lat x lon x 2) coord grid as
+                 returned by vert_interp_grid
+    lats, lons - latitude and longitude of every target cell, arrays of the
+                 target grid shape (e.g. from numpy.meshgrid)
+    horizontal - 'bilinear' or 'nearest', see GridGeometry.sample
+    cacheDir   - where to store the weights, REGRID_DIR by default. An empty
+                 string keeps them in memory only.
+    """
+
+    def __init__(self, geometry, lats, lons, horizontal='bilinear', cacheDir=None):
+        if not isinstance(geometry, GridGeometry):
+            coordGrid = np.asarray(geometry)
+            geometry = GridGeometry(coordGrid[:, :, 0], coordGrid[:, :, 1])
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+        if lats.shape != lons.shape:
+            raise ValueError('target lats and lons differ in shape')
+
+        if cacheDir is None:
+            cacheDir = REGRID_DIR
+
+        self.sourceShape = geometry.shape
+        self.targetShape = lats.shape
+        self.digest = _digest(geometry, lats, lons, horizontal)
+
+        self.weights = _weight_cache.get(self.digest)
+        if self.weights is None:
+            self.weights = self._load(cacheDir)
+        if self.weights is None:
+            self.weights = self._build(geometry, lats.ravel(), lons.ravel(), horizontal)
+            self._save(cacheDir)
+        _weight_cache[self.digest] = self.weights
+
+
+    def _path(self, cacheDir):
+        return os.path.join(cacheDir, 'regrid_%s.npz' % self.digest)
+
+
+    def _load(self, cacheDir):
+        if not cacheDir:
+            return None
+        try:
+            return sparse.load_npz(self._path(cacheDir)).tocsr()
+        except (IOError, ValueError, KeyError):
+            return None
+
+
+    def _save(self, cacheDir):
+        if not cacheDir:
+            return
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+        # write to a temporary file first, so readers never see half a file
+        fd, tmpPath = mkstemp(dir=cacheDir, suffix='.npz')
+        try:
+            fp = os.fdopen(fd, 'wb')
+            sparse.save_npz(fp, self.weights)
+            fp.close()
+            os.rename(tmpPath, self._path(cacheDir))
+        except Exception:
+            os.unlink(tmpPath)
+            raise
+
+
+    def _build(self, geometry, lats, lons, horizontal):
+        numLons = geometry.shape[1]
+        nSource = geometry.shape[0] * numLons
+        nTarget = len(lats)
+
+        if horizontal == 'nearest':
+            latIdx, lonIdx = geometry.index(lats, lons)
+            cols = latIdx * numLons + lonIdx
+            weights = sparse.csr_matrix((np.ones(nTarget), (np.arange(nTarget), cols)),
+                                        shape=(nTarget, nSource))
+
+        elif horizontal == 'bilinear':
+            latIdx, lonIdx, wts = geometry.bilinear(lats, lons)
+            rows = np.tile(np.arange(nTarget), (4, 1))
+            cols = latIdx * numLons + lonIdx
+            # duplicate entries (e.g. on the edge rows) are summed
+            weights = sparse.csr_matrix((wts.ravel(), (rows.ravel(), cols.ravel())),
+                                        shape=(nTarget, nSource))
+            weights.eliminate_zeros()
+
+        else:
+            raise ValueError('unsupported horizontal interpolation \'%s\'' % horizontal)
+
+        return weights
+
+
+    def apply(self, dataGrid, out=None):
+        """Regrid a (..., lat, lon) cube of the source grid to a
+        (..., target shape) cube.
+
+        out - optional preallocated (C ordered) output cube
+        """
+        dataGrid = np.asarray(dataGrid, dtype='float64')
+        lead = dataGrid.shape[:-2]
+        if dataGrid.shape[-2:] != tuple(self.sourceShape):
+            raise ValueError('cube does not match the source grid')
+
+        shape = lead + tuple(self.targetShape)
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape or not out.flags.c_contiguous:
+            raise ValueError('out does not match the target grid')
+
+        # one sparse product per level writes straight into the C ordered
+        # output, which is faster than a single product with the (cells x
+        # levels) matrix followed by a transposed copy
+        levels = dataGrid.reshape((-1, self.weights.shape[1]))
+        targetLevels = out.reshape((len(levels), self.weights.shape[0]))
+        for k in xrange(len(levels)):
+            targetLevels[k] = self.weights.dot(levels[k])
+
+        return out
@@ -0,0 +1,266 @@
+'''
+Size-bounded on-disk caches of NumPy arrays.
+
+Every entry is a directory of .npy files (plus a small JSON metadata file),
+so reads are served with np.load(mmap_mode='r') and only touch the pages
+that are used. Entries are written under a temporary name and renamed into
+place, so concurrent processes never see half an entry. When the cache
+grows over its size limit, the least recently used entries are removed.
+
+The cube cache of decoded GRIB variables is opt-in, either with the
+GDAS_INTERP_CUBE_CACHE environment variable or with:
+
+    cache.enable_cube_cache('/scratch/gdas_cubes', 50 * 2 ** 30)
+
+and so is the product cache of interpolation results (see gdas_interp),
+with GDAS_INTERP_PRODUCT_CACHE or cache.enable_product_cache.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from tempfile import mkdtemp
+
+# size limit of caches which are not given one
+DEFAULT_MAX_BYTES = 10 * 2 ** 30
+
+# bytes read at a time when hashing file contents
+HASH_BLOCK_SIZE = 2 ** 20
+
+# content digests by (path, size, mtime), see file_digest
+_file_digests = {}
+
+
+def file_digest(filename, diskCache=None):
+    '''Return a hex digest identifying a file by its path, size, mtime and
+    content. The content hash is computed once per process for every
+    (path, size, mtime), or only once at all if it is remembered in the
+    given DiskCache.
+    '''
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    ident = (path, st.st_size, st.st_mtime)
+
+    digest = _file_digests.get(ident)
+    identKey = None
+    if digest is None and diskCache is not None:
+        identKey = make_key('digest', ident)
+        entry = diskCache._read(identKey)
+        if entry is not None:
+            digest = entry[1]['digest']
+            _file_digests[ident] = digest
+
+    if digest is None:
+        sha = hashlib.sha1(repr(ident))
+        fp = open(path, 'rb')
+        try:
+            block = fp.read(HASH_BLOCK_SIZE)
+            while block:
+                sha.update(block)
+                block = fp.read(HASH_BLOCK_SIZE)
+        finally:
+            fp.close()
+        digest = sha.hexdigest()
+        _file_digests[ident] = digest
+        if identKey is not None:
+            diskCache.put(identKey, {}, {'digest': digest})
+
+    return digest
+
+
+def make_key(*parts):
+    '''Return a cache key for the repr of the given parts.'''
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+class DiskCache(object):
+    """
+    A directory of cache entries, each a dict of named arrays and a dict of
+    JSON metadata, evicted least recently used first once the entries take
+    more than maxBytes.
+
+    hits, misses - number of get calls which found / did not find an entry
+    """
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created by another process in the meantime
+                if not os.path.isdir(directory):
+                    raise
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+
+    def __contains__(self, key):
+        return os.path.isdir(self._path(key))
+
+
+    def _read(self, key):
+        # (arrays, meta) of an entry, or None
+        path = self._path(key)
+        try:
+            meta = json.load(open(os.path.join(path, 'meta.json')))
+            arrays = {}
+            for name in meta['arrays']:
+                arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            # mark the entry as recently used
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        return arrays, meta['meta']
+
+
+    def get(self, key):
+        """Return the (arrays, meta) of an entry, with the arrays memory mapped
+        read-only, or None if there is no such entry.
+        """
+        entry = self._read(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+
+    def put(self, key, arrays, meta=None):
+        """Store a dict of arrays (and JSON metadata) under key, then evict
+        old entries if the cache is over its size limit.
+        """
+        tmpPath = mkdtemp(dir=self.directory, prefix='.tmp')
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmpPath, name + '.npy'), np.asarray(arr))
+            fp = open(os.path.join(tmpPath, 'meta.json'), 'w')
+            json.dump({'arrays': sorted(arrays.keys()), 'meta': meta}, fp)
+            fp.close()
+
+            try:
+                os.rename(tmpPath, self._path(key))
+            except OSError:
+                # stored by another process in the meantime
+                shutil.rmtree(tmpPath, True)
+        except Exception:
+            shutil.rmtree(tmpPath, True)
+            raise
+
+        self.evict()
+
+
+    def _entries(self):
+        # (last use, size, path) of every entry
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                size = 0
+                for fileName in os.listdir(path):
+                    size += os.path.getsize(os.path.join(path, fileName))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                # evicted by another process
+                continue
+        return entries
+
+
+    def size(self):
+        '''Return the number of bytes used by the entries.'''
+        return sum(entry[1] for entry in self._entries())
+
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache fits in
+        maxBytes.'''
+        entries = self._entries()
+        total = sum(entry[1] for entry in entries)
+
+        entries.sort()
+        for lastUse, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            # readers which already mapped the arrays keep them
+            shutil.rmtree(path, True)
+            total -= size
+
+
+    def clear(self):
+        '''Remove every entry.'''
+        for lastUse, size, path in self._entries():
+            shutil.rmtree(path, True)
+
+
+# cube cache used by GribFile, see enable_cube_cache
+_cube_cache = None
+if os.environ.get('GDAS_INTERP_CUBE_CACHE'):
+    _cube_cache = DiskCache(os.environ['GDAS_INTERP_CUBE_CACHE'])
+
+
+def enable_cube_cache(directory, maxBytes=DEFAULT_MAX_BYTES):
+    '''Cache the variables decoded by GribFile in directory, see GribFile.
+    Returns the DiskCache.
+    '''
+    global _cube_cache
+    _cube_cache = DiskCache(directory, maxBytes)
+    return _cube_cache
+
+
+def disable_cube_cache():
+    '''Stop caching decoded variables.'''
+    global _cube_cache
+    _cube_cache = None
+
+
+def get_cube_cache():
+    '''Return the cube cache DiskCache, or None if it is disabled.'''
+    return _cube_cache
+
+
+# cache of interpolation results used by gdas_interp, see enable_product_cache
+_product_cache = None
+if os.environ.get('GDAS_INTERP_PRODUCT_CACHE'):
+    _product_cache = DiskCache(os.environ['GDAS_INTERP_PRODUCT_CACHE'])
+
+
+def enable_product_cache(directory, maxBytes=DEFAULT_MAX_BYTES):
+    '''Cache the results of the gdas_interp grid and ozone functions in
+    directory. Returns the DiskCache.
+    '''
+    global _product_cache
+    _product_cache = DiskCache(directory, maxBytes)
+    return _product_cache
+
+
+def disable_product_cache():
+    '''Stop caching interpolation results.'''
+    global _product_cache
+    _product_cache = None
+
+
+def get_product_cache():
+    '''Return the product cache DiskCache, or None if it is disabled.'''
+    return _product_cache
+
+
+def cache_stats():
+    '''Return the hit and miss counts of the enabled caches, as a dict of
+    {'cube'/'product': {'hits': n, 'misses': n}}.
+    '''
+    stats = {}
+    for name, diskCache in (('cube', _cube_cache), ('product', _product_cache)):
+        if diskCache is not None:
+            stats[name] = {'hits': diskCache.hits, 'misses': diskCache.misses}
+    return stats
@@ -1,11 +1,9 @@
 import time
-import math
 import numpy as np
-import os
-import shutil
-from multiprocessing import Process
-from tempfile import mkdtemp
-from GribFile import GribFile
+from GribFilePool import GribFilePool
+from GribIndex import GribIndex
+import parallel
+import cache
 from thermo import rh_to_mr
 import ozone as o3
 
@@ -28,26 +26,31 @@ _101_pressure_levels = \
        802.3714,  827.3713,  852.7880,  878.6201,  904.8659,  931.5236, \
        958.5911,  986.0666, 1013.9476, 1042.2319, 1070.9170, 1100.0000]
 
-_101_pressure_values = [0] * len(_101_pressure_levels)
-
 #for i in range(101):
     #_101_pressure_levels[i] = [_101_pressure_levels[i], -1]
 
 
 
-grb = None
 nx = 9
 ny = 35
 nz = 3
-init = True
-med_cached = False
 coef = np.zeros((nx + 1, ny, nz))
-cc   = np.zeros((nz, nx + 1, ny))
-tempPres = None
-rhPres = None
-outPres = None
-coordGrid = None
-NUM_PROCS = 64
+
+# number of grid worker processes, None to choose from the available CPUs
+NUM_PROCS = None
+
+# number of open files an Interpolator keeps by default, see GribFilePool
+GRIB_POOL_SIZE = 4
+
+# part of the product cache keys, bump it when a change alters the results
+# of the cached functions so that older products are not served
+PRODUCT_VERSION = 1
+
+# pixels blended at a time when scattering swath profiles, see _scatter_profiles
+SWATH_BLOCK = 512
+
+# indices of the 101-level profile used as extem101 regression predictors
+_extem_lx = [35, 39, 44, 50, 55, 63, 69, 75, 85]
 
 #  Zone 1
 
@@ -373,563 +376,1333 @@ coef[:,34,2] = [14.277436,    1.044823,   -0.109435,    0.014568,   -0.018874, \
                 -0.004335,    0.018428,   -0.022788,    0.013544,   -0.000572]
 
 
-def _get_lower_bound(vertProf, presVec, pressure):
-    '''Given a sorted vertical profile array and a pressure, return the highest
-    pressure level in the profile array which is less than the given pressure.
-    If no pressure level provides a lower bound, return None.
+def _fit_coefficients(coef):
+    '''Calculate the parabolic fit (in latitude) of the extem101 regression
+    coefficients, as cofit3 does in extem101.f. Returns cc, indexed by
+    (power of |lat|, predictor, output level).
     '''
-    for i in xrange(len(presVec) - 1, -1, -1):
-        # find the first pressure level less or equal to than the given 
-        # pressure and then return it. this only works when vertProf is sorted
-        if presVec[i] <= pressure:
-            return (presVec[i], vertProf[i])
-    
-    return None
+    x1 = 75.0
+    x2 = 45.0
+    x3 = 15.0
+
+    y1 = coef[:,:,0]
+    y2 = coef[:,:,1]
+    y3 = coef[:,:,2]
+
+    x12 = x1*x1
+    x22 = x2*x2
+    x32 = x3*x3
+
+    t1 = x2*x32 - x3*x22
+    t2 = -(x1*x32 - x3*x12)
+    t3 = x1*x22 - x2*x12
+
+    det = t1 + t2 + t3
+
+    cc = np.zeros((nz, nx + 1, ny))
+    cc[0] = (y1*t1 + y2*t2 + y3*t3) / det
+    cc[1] = ((y2*x32 - y3*x22) - (y1*x32 - y3*x12) + (y1*x22 - y2*x12)) / det
+    cc[2] = ((x2*y3 - x3*y2) - (x1*y3 - x3*y1) + (x1*y2 - x2*y1)) / det
+
+    return cc
+
+cc = _fit_coefficients(coef)
+
+# memoized (nx + 1, ny) regression matrices, keyed by |lat|
+_extem_cache = {}
+_EXTEM_CACHE_SIZE = 4096
 
-def _get_upper_bound(vertProf, presVec, pressure):
-    '''Given a sorted vertical profile array and a pressure, return the lowest
-    pressure level in the profile array which is greater than the given pressure.
-    If no pressure level provides an upper bound, return None.
+
+def _extem101_coefs(alat):
+    '''Return the (nx + 1, ny) extem101 regression matrix for the absolute
+    latitude alat: row 0 holds the constant terms, rows 1..nx the weights of
+    the nx predictor temperatures.
     '''
-    for i in xrange(len(presVec)):
-        # find the first pressure level greater than or equal to the given 
-        # pressure and then return it. this only works when vertProf is sorted
-        if presVec[i] >= pressure:
-            return (presVec[i], vertProf[i])
-    
-    return None
-            
+    coefs = _extem_cache.get(alat)
+    if coefs is None:
+        coefs = cc[0] + alat * (cc[1] + alat * cc[2])
+        if len(_extem_cache) >= _EXTEM_CACHE_SIZE:
+            _extem_cache.clear()
+        _extem_cache[alat] = coefs
+
+    return coefs
 
-def _vert_interp_low_pressure(vertProf, presVec, pressure, lat):
-    '''Use regression with parabolic fit coefficients to extrapolate to lower
-    pressure levels than are given in the input profile. Modeled after extem101.f
+
+def _extem101(tx, lats):
+    '''Matrix form of extem101: given the (nx, nCols) predictor temperatures
+    at the _extem_lx levels and the latitude of every column, return the
+    (ny, nCols) regressed temperatures at the top ny levels of the 101-level
+    profile.
     '''
-    global init, med_cached
-    x1 = 75.0
-    x2 = 45.0
-    x3 = 15.0
-    lx = [35, 39, 44, 50, 55, 63, 69, 75, 85]
-    cfl = np.zeros(nx+1)
-
-    # if we haven't already cached the medium pressure levels, cache them
-    if not med_cached:
-        # calculate values at indices from lx of the 101-level profile
-        for i in xrange(len(lx)):
-            _101_pressure_values[lx[i]] = _vert_interp_med_pressure(vertProf, presVec, _101_pressure_levels[lx[i]])
-
-        med_cached = True
-
-    # calculate parabolic fit coefficients
-    if init:
-        init = False
-        for j in xrange(ny):
-            for i in xrange(nx + 1):
-
-                y1 = coef[i,j,0]
-                y2 = coef[i,j,1]
-                y3 = coef[i,j,2]
-                
-                x12 = x1*x1
-                x22 = x2*x2
-                x32 = x3*x3
-
-                t1 = x2*x32 - x3*x22
-                t2 = -(x1*x32 - x3*x12)
-                t3 = x1*x22 - x2*x12
-
-                det = t1 + t2 + t3
-
-                cc[0,i,j] = (y1*t1 + y2*t2 + y3*t3) / det
-                cc[1,i,j] = ((y2*x32 - y3*x22) - (y1*x32 - y3*x12) + (y1*x22 - y2*x12)) / det
-                cc[2,i,j] = ((x2*y3 - x3*y2) - (x1*y3 - x3*y1) + (x1*y2 - x2*y1)) / det
-
-    # load predictors
-    plat = np.zeros(nz)
-    alat = abs(lat)
-    xx = 1
-    for k in xrange(nz):
-        plat[k] = xx
-        xx = xx * alat
-
-    tx = np.zeros(nx)
-    for i in xrange(nx):
-        tx[i] = _101_pressure_values[lx[i]]
-
-    for j in xrange(ny):
-        for i in xrange(nx + 1):
-            cy = 0
-            for k in xrange(nz):
-                cy = cy + cc[k,i,j] * plat[k]
-            cfl[i] = cy
-        sum = cfl[0]
-        for i in xrange(1, nx+1):
-            sum += cfl[i] * tx[i-1]
-        _101_pressure_values[j] = sum
-
-    return _vert_interp_med_pressure(_101_pressure_values, _101_pressure_levels, pressure, True)
-
-
-def _vert_interp_high_pressure(vertProf, presVec, pressure):
-    '''Use logarithmic extrapolation using the highest possible pressure estimate
-    to get values for pressures higher than those given in the profile.
+    nCols = tx.shape[1]
+    alat = np.abs(np.asarray(lats, dtype='float64')).ravel()
+
+    # predictors with a leading column of ones for the constant term
+    x = np.empty((nCols, nx + 1))
+    x[:, 0] = 1.0
+    x[:, 1:] = tx.T
+
+    uniq, inverse = np.unique(alat, return_inverse=True)
+
+    if len(uniq) * 8 > nCols:
+        # few columns share a latitude (point lists, swaths), so evaluate the
+        # quadratic in |lat| as one product per power instead
+        upper = x.dot(cc[0])
+        upper += x.dot(cc[1]) * alat[:, np.newaxis]
+        upper += x.dot(cc[2]) * (alat * alat)[:, np.newaxis]
+        return upper.T
+
+    # one (cols x nx+1) . (nx+1 x ny) product per latitude row
+    upper = np.empty((nCols, ny))
+    if len(uniq) == 1:
+        upper[:] = x.dot(_extem101_coefs(uniq[0]))
+    else:
+        order = np.argsort(inverse, kind='mergesort')
+        bounds = np.searchsorted(inverse[order], np.arange(len(uniq) + 1))
+        for u in xrange(len(uniq)):
+            cols = order[bounds[u]:bounds[u + 1]]
+            upper[cols] = x[cols].dot(_extem101_coefs(uniq[u]))
+
+    return upper.T
+
+
+def _log_interp_indices(presVec, pressure):
+    '''Given a sorted input pressure vector, return for every output pressure
+    the indices (lo, hi) of the two input levels used to compute it and the
+    log-pressure weight w of the upper one, so that:
+
+        value = vertProf[lo] + w * (vertProf[hi] - vertProf[lo])
+
+    Pressures higher than the bottom level are extrapolated from the two
+    lowest levels. Pressures lower than the top level are flagged in the
+    returned mask and must be filled by the caller.
     '''
-    p1 = _get_lower_bound(vertProf, presVec, pressure)
-    p0 = _get_lower_bound(vertProf, presVec, p1[0] - 0.001) # get next lowest level
+    presVec = np.asarray(presVec, dtype='float64')
+    pressure = np.asarray(pressure, dtype='float64')
+    nLevs = len(presVec)
+
+    # highest level <= pressure, lowest level >= pressure
+    lo = np.searchsorted(presVec, pressure, side='right') - 1
+    hi = np.searchsorted(presVec, pressure, side='left')
+
+    low = pressure < presVec[0]
+    high = pressure > presVec[-1]
+    lo[high] = nLevs - 2
+    hi[high] = nLevs - 1
+    lo = np.clip(lo, 0, nLevs - 1)
+    hi = np.clip(hi, 0, nLevs - 1)
+
+    # lo == hi when the pressure falls exactly on an input level
+    exact = lo == hi
+    pLo = presVec[lo]
+    pHi = np.where(exact, pLo * np.e, presVec[hi])
+    w = np.log(pressure / pLo) / np.log(pHi / pLo)
+    w[exact] = 0.0
+
+    return lo, hi, w, low
+
+
+class InterpolationPlan(object):
+    """
+    Precomputed log-pressure interpolation from a fixed set of input pressure
+    levels onto a fixed set of output pressure levels. The bracket indices
+    and weights only depend on the two pressure vectors, so one plan can be
+    applied to any number of columns, and reused for every file with the
+    same levels (see get_plan).
+
+    With extend=True, the plan also precomputes what is needed to extrapolate
+    temperature above the top input level with the extem101 regression.
+    """
+
+    def __init__(self, presVec, pressure, extend=False):
+        self.presVec = np.array(presVec, dtype='float64').ravel()
+        self.pressure = np.array(pressure, dtype='float64').ravel()
+        self.lo, self.hi, self.weight, self.low = \
+            _log_interp_indices(self.presVec, self.pressure)
+
+        self.predictor = None
+        self.below = None
+        self.extension = None
+        if extend and self.low.any():
+            # the regression predictors are the input profile interpolated to
+            # the lx levels of the 101-level profile
+            self.predictor = InterpolationPlan(self.presVec,
+                    [_101_pressure_levels[i] for i in _extem_lx])
+
+            # regressed levels, followed by the input levels below them
+            self.below = self.presVec > _101_pressure_levels[ny - 1]
+            extPres = np.concatenate((_101_pressure_levels[:ny],
+                                      self.presVec[self.below]))
+            self.extension = InterpolationPlan(extPres, self.pressure[self.low])
+
+
+    def apply(self, vertProf):
+        """Interpolate every column of vertProf (levels, ...) onto the output
+        pressures, returning a (len(pressure), ...) array. Output levels above
+        the top input level (self.low) hold the top input value.
+        """
+        w = self.weight.reshape((len(self.weight),) + (1,) * (vertProf.ndim - 1))
+
+        lower = vertProf[self.lo]
+        return lower + w * (vertProf[self.hi] - lower)
+
+
+# InterpolationPlans by (input levels, output levels, extend). The cache is
+# bounded, since callers may pass different output levels on every call
+# (e.g. down to the surface pressure of each pixel).
+_plan_cache = {}
+_PLAN_CACHE_SIZE = 64
+
+def get_plan(presVec, pressure, extend=False):
+    '''Return the (cached) InterpolationPlan for the given input and output
+    pressure levels.
+    '''
+    key = (tuple(np.asarray(presVec, dtype='float64').ravel()),
+           tuple(np.asarray(pressure, dtype='float64').ravel()), extend)
 
-    if pressure == p1[0]:
-        return p1[1]
+    plan = _plan_cache.get(key)
+    if plan is None:
+        plan = InterpolationPlan(key[0], key[1], extend)
+        if len(_plan_cache) >= _PLAN_CACHE_SIZE:
+            _plan_cache.clear()
+        _plan_cache[key] = plan
 
-    # extrapolate highest pressure in 101-level pressure profile
-    y2 = p1[1] + ((p1[1] - p0[1]) * \
-            math.log(float(_101_pressure_levels[-1]) / float(p1[0])) / \
-            math.log(float(p1[0]) / float(p0[0])))
+    return plan
 
-    # put extrapolated point in a tuple for interpolation
-    p2 = (_101_pressure_levels[-1], y2)
 
-    interpVal = _log_interp(p1, p2, pressure)
+def _extend_temperature(tempProf, lats, plan):
+    '''Extrapolate every column of tempProf (levels, nCols) up to 0.005 mb
+    with the extem101 regression. Returns the (levels, nCols) extended columns
+    on plan.extension's input levels: the regressed levels followed by the
+    input levels below them.
+    '''
+    upper = _extem101(plan.predictor.apply(tempProf), lats)
 
-    #print 'lower  val: %f, %f' % (p1[0], p1[1])
-    #print 'interp val: %f, %f' % (pressure, interpVal)
-    #print 'upper  val: %f, %f' % (p2[0], p2[1])
+    return np.vstack((upper, tempProf[plan.below]))
 
-    return interpVal
 
-def _vert_interp_med_pressure(vertProf, presVec, pressure, verbose=False):
-    '''Use logarithmic interpolation to calculate values between pressure
-    levels in the input profile.
+def _align_levels(rhPres, tempPres):
+    '''Return the index of the temperature level at the same pressure as each
+    rh level, or None (after printing an error) if one is missing.
     '''
-    p2 = _get_upper_bound(vertProf, presVec, pressure)
-    p1 = _get_lower_bound(vertProf, presVec, pressure)
+    tempIdx = dict((pres, i) for i, pres in reversed(list(enumerate(tempPres))))
+
+    alignment = []
+    for pres in rhPres:
+        if pres not in tempIdx:
+            # If, for some reason, the temp and rh profiles don't match up, error out
+            print 'Error: could not find temperature for pressure level %d' % pres
+            return None
+        alignment.append(tempIdx[pres])
 
-    if pressure == p1[0]:
-        return p1[1]
-    if pressure == p2[0]:
-        return p2[1]
+    return alignment
 
-    interpVal = _log_interp(p1, p2, pressure)
 
-    #if verbose:
-        #print 'lower  val: %f, %f' % (p1[0], p1[1])
-        #print 'interp val: %f, %f' % (pressure, interpVal)
-        #print 'upper  val: %f, %f' % (p2[0], p2[1])
+def _interp_temperature(tempCols, lats, plan):
+    '''Interpolate (levels, nCols) temperature columns with plan, using the
+    extem101 regression above the top input level.
+    '''
+    dataGrid = plan.apply(tempCols)
+    if plan.extension is not None:
+        # use regression to calculate temperature at low pressure
+        extProf = _extend_temperature(tempCols, lats, plan)
+        dataGrid[plan.low] = plan.extension.apply(extProf)
+
+    return dataGrid
 
-    return interpVal
 
+def _interp_mixing_ratio(rhCols, rhPres, tempCols, alignment, plan, fastSvp=False):
+    '''Convert (levels, nCols) relative humidity columns to mixing ratio,
+    using the temperature levels given by alignment (see _align_levels), and
+    interpolate them with plan. fastSvp selects the table-driven saturation
+    vapor pressure (see thermo.svp).
+    '''
+    presCols = np.asarray(rhPres, dtype='float64')[:, np.newaxis]
+    mrCols = np.maximum(rh_to_mr(rhCols, presCols, tempCols[alignment], fastSvp), 0.0030)
 
-def _log_interp(p1, p2, x):
-    '''Perform the actual logarithmic interpolation.'''
-    return p1[1] + (((p2[1] - p1[1]) * \
-            math.log(float(x) / float(p1[0]))) / \
-            math.log(float(p2[0]) / float(p1[0])))
+    dataGrid = plan.apply(mrCols)
+    # fix the water level at low pressure
+    dataGrid[plan.low] = 0.003
 
+    return dataGrid
 
-def _get_input_profs(varName, lat, lon, filename, tempProf, rhProf, grid=False):
-    global grb
 
-    # need temp prof for both mixing ratio and temperature interpolation
-    retDict = {}
-    coordGrid = None
-    rhPres = None
-    tempPres = None
-    if tempProf == None:
-        # if no profile or file was provided, there has been an error
-        if filename == None:
-            print '_get_input_profs: no input data provided'
+def _ozone_anchors(o3Pres):
+    '''Return the indices into o3Pres of the GDAS levels that replace the
+    climatology in ozone.adjo3_batch (10, 20, 30, 50, 70 and 100 mb), or None
+    if one of them is missing.
+    '''
+    levelMap = dict((p, i) for i, p in enumerate(o3Pres))
+    anchors = []
+    for p in o3.gdas_levels:
+        if p not in levelMap:
+            print 'Error: GDAS ozone has no %s mb level' % p
             return None
+        anchors.append(levelMap[p])
 
-        # only create a new grib file if it is different from the current one
-        if grb is None or grb.filename != filename:
-            grb = GribFile(filename)
+    return anchors
 
-        if not grid:
-            tempPres, tempProf = grb.readDataLatLon('Temperature', lat, lon)
-            retDict['tempPres'] = tempPres
-            retDict['tempProf'] = tempProf
-        else:
-            coordGrid, tempPres, tempProf = grb.readDataAllLatLon('Temperature')
-            retDict['coordGrid'] = coordGrid
-            retDict['tempProf'] = tempProf
-            retDict['tempPres'] = tempPres
-    else:
-        retDict['tempPres'] = tempProf[0]
-        retDict['tempProf'] = tempProf[1]
 
-    # if we weren't supplied a rel hum profile and that is what we are trying
-    # to measure, get one from the provided file (which should exist)
-    if rhProf == None and varName == 'Relative humidity':
-        # if no profile or file was provided, there has been an error
-        if filename == None:
-            print '_get_input_profs: no input data provided'
-            return None
+def _interp_ozone(o3Cols, o3Pres, lats, month):
+    '''Return the 101-level ozone profiles (ppmv) for (levels, nCols) GDAS
+    ozone mixing ratio columns: the climatology of the given month adjusted
+    to the GDAS values.
+    '''
+    anchors = _ozone_anchors(o3Pres)
+    if anchors is None:
+        return None
 
-        # only create a new grib file if it is different from the current one
-        # or none currently exists
-        if grb is None or grb.filename != filename:
-            grb = GribFile(filename)
+    # convert ozone units
+    gdasO3 = np.asarray(o3Cols, dtype='float64')[anchors] * (1000000.0 * (28.97 / 48.0))
 
-        if not grid:
-            rhPres, rhProf = grb.readDataLatLon(varName, lat, lon)
-            retDict['rhPres'] = rhPres
-            retDict['rhProf'] = rhProf
-        else:
-            coordGrid, rhPres, rhProf = grb.readDataAllLatLon(varName)
-            retDict['coordGrid'] = coordGrid
-            retDict['rhPres'] = rhPres
-            retDict['rhProf'] = rhProf
-    elif varName == 'Relative humidity':
-        # If rhProf is not none, and we are measuring relative humidity
-        retDict['rhPres'] = rhProf[0]
-        retDict['rhProf'] = rhProf[1]
-    else:
-        # We are not measuring relative humidity
-        retDict['rhPres'] = None
-        retDict['rhProf'] = None
+    # get estimated profiles, adjusted based on GDAS data
+    clim = o3.clozo101_batch(lats, month)
+    return o3.adjo3_batch(clim, gdasO3.T).T
 
 
-    # We already have a temperature and relative humidity profile, but need a grid.
-    # Grab the grid from our input profile
-    if tempProf is not None and rhProf is not None and grid:
-        if filename == None:
-            print '_get_input_profs: no input data provided'
+def _vert_interp_cube(varName, tempPres, tempProf, rhPres, rhProf, outPres, lats, plan=None,
+                      fastSvp=False):
+    '''Interpolate whole cubes of profiles at once.
+
+    tempProf and rhProf are (levels, ...) arrays of temperature and relative
+    humidity columns on the tempPres and rhPres levels, and lats holds the
+    latitude of every column (shape tempProf.shape[1:]). Returns the
+    (len(outPres), ...) interpolated temperature or mixing ratio cube.
+
+    plan    - optional InterpolationPlan from the temperature (or rh) levels
+              to outPres. By default the cached plan from get_plan is used.
+    fastSvp - use the table-driven saturation vapor pressure (see thermo.svp)
+              to convert relative humidity to mixing ratio
+    '''
+    tempProf = np.asarray(tempProf, dtype='float64')
+    colShape = tempProf.shape[1:]
+    nCols = int(np.prod(colShape))
+    outPres = np.asarray(outPres, dtype='float64').ravel()
+    lats = np.asarray(lats, dtype='float64').ravel()
+
+    tempCols = tempProf.reshape((len(tempProf), nCols))
+
+    if varName == 'Temperature':
+        if plan is None:
+            plan = get_plan(tempPres, outPres, True)
+        dataGrid = _interp_temperature(tempCols, lats, plan)
+
+    elif varName == 'Relative humidity':
+        # match every rh level to the temperature at the same pressure level
+        alignment = _align_levels(rhPres, tempPres)
+        if alignment is None:
             return None
 
-        # only create a new grib file if it is different from the current one
-        if grb is None or grb.filename != filename:
-            grb = GribFile(filename)
+        if plan is None:
+            plan = get_plan(rhPres, outPres)
+        rhCols = np.asarray(rhProf, dtype='float64').reshape((len(rhProf), nCols))
+        dataGrid = _interp_mixing_ratio(rhCols, rhPres, tempCols, alignment, plan, fastSvp)
 
-        # Get the coordinate grid
-        coordGrid, tempPres, tempProf = grb.readDataAllLatLon('Temperature')
-        retDict['coordGrid'] = coordGrid
+    else:
+        print 'Error: Unsupported varName: %s' % varName
+        exit(1)
 
-    return retDict
+    return dataGrid.reshape((len(outPres),) + colShape)
 
 
-def _make_ret_prof(pressure, grid=False, gridSize=None):
-    # Copy pressure values into our return profile
-    retProf = []
-    if pressure == None:
-        # if no pressure given, just assume 101-level profile
-        retProf = [ [_101_pressure_levels[i], _101_pressure_values[i]] for i in xrange(len(_101_pressure_levels)) ]
-        if grid:
-            # if our profile is a grid, make the output columns a grid of size (nLat, nLons)
-            for i in xrange(len(retProf)):
-                retProf[i][1] = np.ndarray((gridSize[0], gridSize[1]))
+def _make_out_pres(pressure):
+    # if no pressure given, just assume 101-level profile
+    if pressure is None:
+        return list(_101_pressure_levels)
 
     elif type(pressure) == int or type(pressure) == float or type(pressure) == np.float64:
         # if the pressure is a single number, convert it to a list for processing
-        retProf.append([pressure, -1])
-        if grid:
-            for i in xrange(len(retProf)):
-                retProf[i][1] = np.ndarray((gridSize[0], gridSize[1]))
+        return [pressure]
 
     elif type(pressure) == list or type(pressure) == np.ndarray:
-        # if the pressure was given as a list, copy it into our return 
-        # profile for processing
+        # make sure the pressure levels are of correct type
         for p in pressure:
             if type(p) != int and type(p) != float and type(p) != np.float64:
-                # make sure the pressure levels are of correct type
                 print 'Error: incompatible pressure type \'%s\'' % type(p)
                 return None
-            retProf.append([p, -1])
-        if grid:
-            for i in xrange(len(retProf)):
-                retProf[i][1] = np.ndarray((gridSize[0], gridSize[1]))
-    else:
-        # pressure is not a compatible data type
-        print 'Error: pressure is an incompatible data type \'%s\'' % type(pressure)
-        return None
+        return list(pressure)
+
+    # pressure is not a compatible data type
+    print 'Error: pressure is an incompatible data type \'%s\'' % type(pressure)
+    return None
+
+
+def _grid_kernel(args, cols):
+    '''Worker kernel for Interpolator.vert_interp_grid, see parallel.map_columns.'''
+    varName, tempPres, rhPres, outPres, fastSvp = args
+    return _vert_interp_cube(varName, tempPres, cols['temp'], rhPres,
+                             cols.get('rh'), outPres, cols['lats'], None, fastSvp)
+
+
+def _all_kernel(args, cols):
+    '''Worker kernel for Interpolator.vert_interp_all, see parallel.map_columns.
+    Returns the temperature, mixing ratio and ozone columns stacked.
+    '''
+    tempPres, rhPres, o3Pres, alignment, month, fastSvp = args
+    tempCols = cols['temp']
+    lats = cols['lats']
+
+    tempPlan = get_plan(tempPres, _101_pressure_levels, True)
+    rhPlan = get_plan(rhPres, _101_pressure_levels)
 
-    return retProf
+    return np.vstack((_interp_temperature(tempCols, lats, tempPlan),
+                      _interp_mixing_ratio(cols['rh'], rhPres, tempCols, alignment, rhPlan, fastSvp),
+                      _interp_ozone(cols['o3'], o3Pres, lats, month)))
 
 
-def vert_interp(varName, lat, lon, pressure=None, filename=None, tempProf=None, rhProf=None):
-    '''Given an input profile or file from which to extract one, as well as a latitude,
-    longitude, and (list of) pressure level(s), compute either the interpolated temperature 
-    or mixing ratio, based on the varName given.
+def _ozone_kernel(args, cols):
+    '''Worker kernel for Interpolator.vert_interp_ozone_grid, see parallel.map_columns.'''
+    o3Pres, month = args
+    return _interp_ozone(cols['o3'], o3Pres, cols['lats'], month)
 
-    varName  - the name of the measurement we are looking to interpolate
-    lat      - the latitude of the measurement
-    lon      - the longitude of the measurement
-    pressure - the output pressure vector
-    filename - the file we want to read input profiles from
-    tempProf - A pair of lists (pressure list, data list), which specifies an 
-               input temperature profile
-    rhProf   - A pair of lists (pressure list, data list), which specifies an 
-               input relative humidity profile
 
-    return: list of [pressure, measurement] pairs
+def _series_task(task):
+    '''Worker for Interpolator.vert_interp_series: the (pres x point)
+    profiles of one file, read through its message index.
     '''
-    global med_cached
+    varName, varNames, filename, lats, lons, outPres, horizontal, fastSvp = task
 
-    # make us recalculate the medium pressure values the first time we do low-pressure interpolation
-    med_cached = False
+    columns = GribIndex(filename).readVariablesLatLon(varNames, lats, lons, horizontal)
+    tempPres, tempCols = columns['Temperature']
+    rhPres, rhCols = columns.get('Relative humidity', (None, None))
 
-    # Copy pressure values into our return profile
-    retProf = _make_ret_prof(pressure)
+    return _vert_interp_cube(varName, tempPres, tempCols, rhPres, rhCols, outPres, lats, None,
+                             fastSvp)
 
-    inputDict = _get_input_profs(varName, lat, lon, filename, tempProf, rhProf) 
-    tempPres = inputDict['tempPres']
-    rhPres = inputDict['rhPres']
-    tempProf = inputDict['tempProf']
-    rhProf = inputDict['rhProf']
 
-    # temp prof should always have something in it now
-    if tempProf is None:
+def _cube_plan(varName, tempPres, rhPres, outPres):
+    '''Return the InterpolationPlan _vert_interp_cube uses for varName by
+    default.
+    '''
+    if varName == 'Temperature':
+        return get_plan(tempPres, outPres, True)
+    return get_plan(rhPres, outPres)
+
+
+def _plan_matches(plan, varName, tempPres, rhPres):
+    # True if plan applies to the input levels of varName
+    if varName == 'Temperature':
+        presVec = tempPres
+    else:
+        presVec = rhPres
+    return np.array_equal(plan.presVec, np.asarray(presVec, dtype='float64').ravel())
+
+
+def _time_weights(fileTimes, obsTimes, shape):
+    '''Return the weight of the second of two files at fileTimes for every
+    observation time, linear in time and clipped to [0, 1], broadcast to the
+    given shape.
+    '''
+    startTime = float(fileTimes[0])
+    endTime = float(fileTimes[1])
+    if endTime == startTime:
+        print 'Error: the two files have the same time'
         return None
 
-    if varName == 'Relative humidity':
-        # If we are computing relative humidity, first convert to mixing ratio
-        # before interpolating
-        vertProf = []
-        vertProf[:] = rhProf[:]
-        for i in xrange(len(vertProf)):
-            rh = rhProf[i]
-            pres = rhPres[i]
-            temp = None
-
-            # make sure we get the temperature for the correct pressure level
-            for j in xrange(len(tempPres)):
-                if tempPres[j] == pres:
-                    temp = tempProf[j]
-                    break
-            if temp == None:
-                # If, for some reason, the temp and rh profiles don't match up, error out
-                print 'Error: could not find temperature for pressure level %d' % rhPres[i]
+    weights = (np.asarray(obsTimes, dtype='float64') - startTime) / (endTime - startTime)
+    return np.clip(np.broadcast_to(weights, shape), 0.0, 1.0)
+
+
+def _scatter_profiles(cellProfs, inverse, weights, shape, out=None):
+    '''Write (pres x cell) profiles to the pixels of a (pres,) + shape output,
+    where pixel p gets the sum of weights[k, p] * cellProfs[:, inverse[k, p]]
+    over the stencil k, or cellProfs[:, inverse[0, p]] if weights is None.
+    '''
+    nOut = len(cellProfs)
+    nPixels = inverse.shape[1]
+    if out is None:
+        out = np.empty((nOut,) + shape)
+    elif out.shape != (nOut,) + shape or not out.flags.c_contiguous:
+        raise ValueError('out does not match the swath')
+
+    outLevels = out.reshape((nOut, nPixels))
+    if weights is None:
+        # one level at a time to keep the temporaries small
+        for k in xrange(nOut):
+            outLevels[k] = cellProfs[k, inverse[0]]
+    else:
+        # blend whole profiles for blocks of pixels that fit in cache,
+        # which is much faster than one gather per level and stencil cell
+        cellRows = np.ascontiguousarray(cellProfs.T)
+        for start in xrange(0, nPixels, SWATH_BLOCK):
+            end = min(start + SWATH_BLOCK, nPixels)
+            block = cellRows[inverse[0, start:end]] * weights[0, start:end, np.newaxis]
+            for j in xrange(1, len(inverse)):
+                block += cellRows[inverse[j, start:end]] * weights[j, start:end, np.newaxis]
+            outLevels[:, start:end] = block.T
+
+    return out
+
+
+def _product_key(name, filename, *params):
+    '''Return the product cache key of a call, or None if the product cache
+    is disabled or the call can not be cached.
+    '''
+    productCache = cache.get_product_cache()
+    if productCache is None or filename is None:
+        return None
+
+    # normalize pressure lists and numbers
+    keyParams = []
+    for param in params:
+        if isinstance(param, (list, tuple, np.ndarray)):
+            try:
+                param = tuple(np.asarray(param, dtype='float64').ravel())
+            except (TypeError, ValueError):
                 return None
+        elif isinstance(param, (int, float, np.floating)) and not isinstance(param, bool):
+            param = float(param)
+        keyParams.append(param)
 
-            # Convert rel hum to mixing ratio
-            vertProf[i] = max(rh_to_mr(rh, np.array([pres]), np.array([temp]))[0], 0.0030)
+    return cache.make_key('product', PRODUCT_VERSION, name,
+                          cache.file_digest(filename, productCache), keyParams)
 
-        vertPres = rhPres
 
-    elif varName == 'Temperature':
-        # If we are computing Temperature, just grab the temperature vector and
-        # interpolate
-        vertProf = tempProf
-        vertPres = tempPres
+def _get_product(productKey):
+    # cached result of a call, see _product_key
+    if productKey is None:
+        return None
+
+    entry = cache.get_product_cache().get(productKey)
+    if entry is None:
+        return None
+
+    arrays, meta = entry
+    items = []
+    for i, kind in enumerate(meta['kinds']):
+        item = arrays['r%d' % i]
+        if kind == 'list':
+            item = item.tolist()
+        items.append(item)
 
+    if meta['single']:
+        return items[0]
+    return tuple(items)
+
+
+def _put_product(productKey, result):
+    # store the result of a call in the product cache, and return it
+    if productKey is None or result is None:
+        return result
+
+    single = not isinstance(result, tuple)
+    if single:
+        items = (result,)
     else:
-        print 'Error: Unsupported varName: %s' % varName
-        exit(1)
+        items = result
+
+    arrays = {}
+    kinds = []
+    for i, item in enumerate(items):
+        arrays['r%d' % i] = np.asarray(item)
+        if isinstance(item, list):
+            kinds.append('list')
+        else:
+            kinds.append('array')
+
+    productCache = cache.get_product_cache()
+    if productCache is not None:
+        productCache.put(productKey, arrays, {'kinds': kinds, 'single': single})
+
+    return result
 
-    for i in xrange(len(retProf)):
-        if retProf[i][0] < vertPres[0]:
-            # if the pressure is atmospherically higher than the original 26 levels
-            #print 'low pressure:'
-            if varName == 'Temperature':
-                # use regression to calculate temperature at low pressure
-                retProf[i][1] = _vert_interp_low_pressure(tempProf, tempPres, retProf[i][0], lat)
-            elif varName == 'Relative humidity':
-                # fix the water level at low pressure
-                retProf[i][1] = 0.003
-
-        elif retProf[i][0] > vertPres[-1]:
-            # if the pressure is atmospherically lower than the original 26 levels
-            # extrapolate using the highest possible pressure level
-            #print 'high pressure:'
-            temp = _vert_interp_high_pressure(tempProf, tempPres, retProf[i][0])
-            if varName == 'Temperature':
-                retProf[i][1] = temp
-            elif varName == 'Relative humidity':
-                mr = _vert_interp_high_pressure(vertProf, vertPres, retProf[i][0])
-                #print temp, mr
-                retProf[i][1] = mr
 
+class Interpolator(object):
+    """
+    Vertical interpolation of GDAS temperature, mixing ratio and ozone
+    profiles.
+
+    An Interpolator keeps its open files in a GribFilePool, so alternating
+    between a few files does not reopen them. By default every instance has
+    its own pool, so separate instances share no mutable state and can run
+    concurrently, e.g. one per thread; threads may also share one pool (see
+    GribFilePool). The regression coefficients and cached interpolation
+    plans they use are read-only module tables.
+
+    filename - optional file to open right away
+    pool     - GribFilePool to take the files from, by default a new pool
+               of GRIB_POOL_SIZE handles
+
+    With the product cache enabled (see cache.enable_product_cache), the
+    results of vert_interp_grid (for files), vert_interp_ozone,
+    vert_interp_ozone_grid and vert_interp_all are stored, and calls with
+    the same file contents and parameters return them as read-only memory
+    mapped arrays without decoding or interpolating anything.
+    """
+
+    def __init__(self, filename=None, pool=None):
+        if pool is None:
+            pool = GribFilePool(GRIB_POOL_SIZE)
+        self.pool = pool
+        if filename is not None:
+            self.pool.get(filename)
+
+
+    def _get_grib(self, filename):
+        # reuse the open handle of the file, if the pool still has it
+        return self.pool.get(filename)
+
+
+    def close(self):
+        '''Close the files opened by this Interpolator.'''
+        self.pool.close()
+
+
+    def _get_input_profs(self, varName, lat, lon, filename, tempProf, rhProf, grid=False,
+                         horizontal='nearest'):
+        # need temp prof for both mixing ratio and temperature interpolation
+        retDict = {}
+
+        # read both grids in one pass over the file if we need them
+        if grid and filename is not None and tempProf is None and rhProf is None \
+                and varName == 'Relative humidity':
+            cubes = self._get_grib(filename).readVariables(['Temperature', varName])
+            retDict['coordGrid'] = cubes['Temperature'][0]
+            tempProf = cubes['Temperature'][1:]
+            rhProf = cubes[varName][1:]
+
+        if tempProf is None:
+            # if no profile or file was provided, there has been an error
+            if filename is None:
+                print '_get_input_profs: no input data provided'
+                return None
+
+            grb = self._get_grib(filename)
+            if not grid:
+                tempPres, tempProf = grb.readDataLatLon('Temperature', lat, lon, horizontal)
+            else:
+                coordGrid, tempPres, tempProf = grb.readDataAllLatLon('Temperature')
+                retDict['coordGrid'] = coordGrid
+            retDict['tempPres'] = tempPres
+            retDict['tempProf'] = tempProf
         else:
-            # if the pressure falls within the original 26 levels
-            # just interpolate
-            #print 'med pressure:'
-            temp = _vert_interp_med_pressure(tempProf, tempPres, retProf[i][0], True)
-            if varName == 'Temperature':
-                retProf[i][1] = temp
-            elif varName == 'Relative humidity':
-                mr = _vert_interp_med_pressure(vertProf, vertPres, retProf[i][0], True)
-                #print temp, mr
-                retProf[i][1] = mr
-
-    return retProf
-
-def vert_interp_ozone(filename, lat, lon, month):
-    '''Given an input profile extracted using the filename, latitude,
-    and longitude, compute the extended ozone profile for
-    a location in the given month.
-    '''
-    global grb
+            retDict['tempPres'] = tempProf[0]
+            retDict['tempProf'] = tempProf[1]
+
+        # if we weren't supplied a rel hum profile and that is what we are trying
+        # to measure, get one from the provided file (which should exist)
+        if rhProf is None and varName == 'Relative humidity':
+            # if no profile or file was provided, there has been an error
+            if filename is None:
+                print '_get_input_profs: no input data provided'
+                return None
 
-    if grb is None or grb.filename != filename:
-        grb = GribFile(filename)
+            grb = self._get_grib(filename)
+            if not grid:
+                rhPres, rhProf = grb.readDataLatLon(varName, lat, lon, horizontal)
+            else:
+                coordGrid, rhPres, rhProf = grb.readDataAllLatLon(varName)
+                retDict['coordGrid'] = coordGrid
+            retDict['rhPres'] = rhPres
+            retDict['rhProf'] = rhProf
+        elif varName == 'Relative humidity':
+            # If rhProf is not none, and we are measuring relative humidity
+            retDict['rhPres'] = rhProf[0]
+            retDict['rhProf'] = rhProf[1]
+        else:
+            # We are not measuring relative humidity
+            retDict['rhPres'] = None
+            retDict['rhProf'] = None
+
+        # We already have our input profiles, but need a grid.
+        # Grab the grid from the file
+        if grid and 'coordGrid' not in retDict:
+            if filename is None:
+                print '_get_input_profs: no input data provided'
+                return None
 
-    o3prof = grb.readDataLatLon('O3MR', lat, lon)
+            coordGrid, tempPres, tempProf = self._get_grib(filename).readDataAllLatLon('Temperature')
+            retDict['coordGrid'] = coordGrid
 
-    # convert ozone units
-    for i in xrange(len(o3prof)):
-        o3prof[i] = (o3prof[i][0], o3prof[i][1] * 1000000.0 * (28.97 / 48.0))
+        return retDict
+
+
+    def vert_interp(self, varName, lat, lon, pressure=None, filename=None, tempProf=None, rhProf=None,
+                    horizontal='nearest'):
+        '''Given an input profile or file from which to extract one, as well as a latitude,
+        longitude, and (list of) pressure level(s), compute either the interpolated temperature 
+        or mixing ratio, based on the varName given.
+
+        varName  - the name of the measurement we are looking to interpolate
+        lat      - the latitude of the measurement
+        lon      - the longitude of the measurement
+        pressure - the output pressure vector
+        filename - the file we want to read input profiles from
+        tempProf - A pair of lists (pressure list, data list), which specifies an 
+                   input temperature profile
+        rhProf   - A pair of lists (pressure list, data list), which specifies an 
+                   input relative humidity profile
+        horizontal - 'nearest' to use the grid cell nearest to (lat,lon), or
+                   'bilinear' to interpolate between the four surrounding cells
+
+        return: list of [pressure, measurement] pairs
+        '''
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
 
-    # get estimated profile
-    ozone = o3.clozo101(lat, month)
-    # adjust profile based on GDAS data
-    adj_ozone = o3.adjo3(ozone, o3prof)
+        inputDict = self._get_input_profs(varName, lat, lon, filename, tempProf, rhProf, False,
+                                          horizontal)
+        if inputDict is None:
+            return None
 
-    retProf = []
-    for i in xrange(len(adj_ozone)):
-        retProf.append([_101_pressure_levels[i], float(adj_ozone[i])])
+        # temp prof should always have something in it now
+        if inputDict['tempProf'] is None:
+            return None
 
-    return retProf
+        # interpolate as a single-column cube
+        tempCol = np.asarray(inputDict['tempProf'], dtype='float64')[:, np.newaxis]
+        rhCol = None
+        if inputDict['rhProf'] is not None:
+            rhCol = np.asarray(inputDict['rhProf'], dtype='float64')[:, np.newaxis]
 
-def _process_columns(varName, tempFn, rhFn, outFn, tempRecSz, rhRecSz, \
-                     outRecSz, offset, nLats, nLons, nRecs):
-    global tempPres
-    global rhPres
-    global outPres
-    global coordGrid
+        column = _vert_interp_cube(varName, inputDict['tempPres'], tempCol,
+                                   inputDict['rhPres'], rhCol, outPres, [lat])
+        if column is None:
+            return None
 
-    if varName != 'Temperature' and varName != 'Relative humidity':
-        print 'Invalid varName %s' % varName
-        exit(1)
+        return [ [outPres[i], column[i, 0]] for i in xrange(len(outPres)) ]
 
-    # always get the temperture vectors
-    tempFp = np.memmap(tempFn, dtype='float64', mode='c', shape=(nLats * nLons, tempRecSz))
 
-    # only get the relative humidity vectors if we are measuring relative humidity
-    rhFp = None
-    if varName == 'Relative humidity':
-        rhFp = np.memmap(rhFn, dtype='float64', mode='c', shape=(nLats * nLons, rhRecSz))
+    def _check_point_var(self, varName):
+        # variables read for the point and swath interpolation of varName
+        if varName != 'Temperature' and varName != 'Relative humidity':
+            print 'Invalid varName %s' % varName
+            exit(1)
 
-    outFp = np.memmap(outFn, dtype='float64', shape=(nLats * nLons, outRecSz))
+        varNames = ['Temperature']
+        if varName == 'Relative humidity':
+            varNames.append(varName)
+        return varNames
 
-    # process nRecs records
-    col = 0
-    for i in xrange(offset, offset + nRecs):
 
-            if i >= nLats * nLons:
-                # if we don't have any more records to process, 
-                # just break out of the loop
-                break
+    def _interp_columns(self, varName, columns, outPres, lats, plan, fastSvp):
+        # interpolate the (presVec, (levels x nCols)) input columns of varName,
+        # with the given plan (or a new one), returning the profiles and plan
+        tempPres, tempCols = columns['Temperature']
+        rhPres, rhCols = columns.get('Relative humidity', (None, None))
 
-            lat, lon = divmod(i, nLons)
-            #print lat, lon
+        if plan is None:
+            plan = _cube_plan(varName, tempPres, rhPres, outPres)
+        elif not _plan_matches(plan, varName, tempPres, rhPres):
+            print 'Error: input files have different pressure levels'
+            return None
 
-            #t = time.time()
-            tempData = tempFp[i]
-            tempCol = (tempPres, tempData)
+        dataGrid = _vert_interp_cube(varName, tempPres, tempCols, rhPres, rhCols, outPres, lats,
+                                     plan, fastSvp)
+        if dataGrid is None:
+            return None
 
-            rhCol = None
-            if rhFp is not None:
-                rhData = rhFp[i]
-                rhCol = (rhPres, rhData)
+        return dataGrid, plan
 
-            column = vert_interp(varName, coordGrid[lat, lon, 0], coordGrid[lat, lon, 1], 
-                                 outPres, None, tempCol, rhCol)
 
-            #column = [ (0, 0) for i in range(len(retProf)) ]
+    def _point_profiles(self, varName, filename, lats, lons, outPres, horizontal, fastSvp,
+                        plan=None):
+        # (pres x location) profiles of a file, see vert_interp_points
+        varNames = self._check_point_var(varName)
 
-            for j in xrange(len(column)):
-                column[j] = column[j][1]
-                #retProf[i][1][lat][lon] = column[i][1]
+        # decode every record once and gather the columns of all locations
+        columns = self._get_grib(filename).readVariablesLatLon(varNames, lats, lons, horizontal)
 
-            #for j in xrange(len(column)):
-                #outFp[i, j] = column[j]
-            outFp[i, :] = column[:]
+        return self._interp_columns(varName, columns, outPres, lats, plan, fastSvp)
 
-            #print outFp[i]
 
-            #print 'prof col %5d: %1.7f' % (col, time.time() - t) 
-            col += 1
+    def _swath_cells(self, geometry, lats, lons, horizontal):
+        # map pixels to (stencils of) distinct flat cell indices, returning the
+        # cells, the (stencil x pixel) indices into them and stencil weights
+        nLons = geometry.shape[1]
 
-    #print '-' * 80
-    #print outFp[offset]
-    #print '-' * 80
-    #outFp.flush()
-    #del outFp
-    return
+        if horizontal == 'nearest':
+            latIdx, lonIdx = geometry.index(lats, lons)
+            cellIdx = (latIdx * nLons + lonIdx)[np.newaxis]
+            weights = None
+        elif horizontal == 'bilinear':
+            latIdx, lonIdx, weights = geometry.bilinear(lats, lons)
+            cellIdx = latIdx * nLons + lonIdx
+        else:
+            raise ValueError('unsupported horizontal interpolation \'%s\'' % horizontal)
 
+        cells, inverse = np.unique(cellIdx, return_inverse=True)
+        return cells, inverse.reshape(cellIdx.shape), weights
 
-def vert_interp_grid(varName, pressure=None, filename=None, tempProf=None, rhProf=None):
-    global coordGrid
-    global tempPres
-    global rhPres
-    global outPres
-    inputDict = _get_input_profs(varName, 0, 0, filename, tempProf, rhProf, True)
-    coordGrid = inputDict['coordGrid']
-    tempPres = inputDict['tempPres']
-    rhPres = inputDict['rhPres']
-    tempProf = inputDict['tempProf']
-    rhProf = inputDict['rhProf']
 
-    if pressure is None:
-        outPres = [ _101_pressure_levels[i] for i in xrange(len(_101_pressure_levels)) ]
-    else:
-        outPres = pressure
+    def _cell_profiles(self, varName, filename, geometry, cells, outPres, fastSvp, plan=None):
+        # (pres x cell) profiles of the given flat cells of a file, using the
+        # cell latitudes, see vert_interp_swath
+        varNames = self._check_point_var(varName)
 
-    nLats = len(coordGrid)
-    nLons = len(coordGrid[0])
+        grb = self._get_grib(filename)
+        if not grb.getGeometry().sameGrid(geometry):
+            print 'Error: %s is on a different grid' % filename
+            return None
 
-    # reshape our input profiles to make them easier to process
-    tempProf = tempProf.reshape((len(tempProf), nLats * nLons)).T
-    if rhProf is not None:
-        rhProf   = rhProf.reshape((len(rhProf), nLats * nLons)).T
+        cubes = grb.readVariables(varNames)
+        columns = {}
+        for name in varNames:
+            _, presVec, dataGrid = cubes[name]
+            columns[name] = (presVec, dataGrid.reshape((len(dataGrid), -1))[:, cells])
+        cellLats = geometry.coordGrid[:, :, 0].ravel()[cells]
+
+        return self._interp_columns(varName, columns, outPres, cellLats, plan, fastSvp)
+
+
+    def vert_interp_points(self, varName, lats, lons, pressure=None, filename=None,
+                           fastSvp=False, horizontal='nearest'):
+        '''Interpolate the temperature or mixing ratio profiles of many
+        locations of a file at once.
+
+        varName  - the name of the measurement we are looking to interpolate
+        lats     - the latitudes of the locations
+        lons     - the longitudes of the locations
+        pressure - the output pressure vector
+        filename - the file we want to read input profiles from
+        fastSvp  - see vert_interp_grid
+        horizontal - 'nearest' or 'bilinear', see vert_interp
+
+        return: (location x pres) data array
+        '''
+        if filename is None:
+            print 'vert_interp_points: no input data provided'
+            return None
 
-    # temp prof should always have something in it now
-    if tempProf is None:
-        return None
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
 
-    gridSize = (nLats, nLons)
+        lats = np.asarray(lats, dtype='float64').ravel()
+        lons = np.asarray(lons, dtype='float64').ravel()
 
-    # TODO: Might not need to make a return profile (we can just get the length of outPres)
-    # - Our return profile is just outFp
-    retProf = _make_ret_prof(outPres, True, gridSize)
+        profiles = self._point_profiles(varName, filename, lats, lons, outPres, horizontal,
+                                        fastSvp)
+        if profiles is None:
+            return None
 
-    # Can now memmap our input and output profiles
-    tmpDir = mkdtemp()
+        return np.ascontiguousarray(profiles[0].T)
 
-    tempFile = os.path.join(tmpDir, 'temp_file.dat')
-    tempFp = np.memmap(tempFile, dtype='float64', mode='w+', shape=tempProf.shape)
-    tempFp[:] = tempProf[:]
-    del tempFp
 
-    rhFile = None
-    if rhProf is not None:
-        rhFile = os.path.join(tmpDir, 'rh_file.dat')
-        rhFp = np.memmap(rhFile, dtype='float64', mode='w+', shape=rhProf.shape)
-        rhFp[:] = rhProf[:]
-        del rhFp
+    def vert_interp_points_time(self, varName, lats, lons, filenames, fileTimes, obsTimes,
+                                pressure=None, fastSvp=False, horizontal='nearest'):
+        '''Interpolate the profiles of many locations observed between the
+        times of two GDAS files, blending the profiles of both files linearly
+        in time. Both files are interpolated with the same InterpolationPlan.
 
-    outFile = os.path.join(tmpDir, 'out_file.dat')
-    outFp = np.memmap(outFile, dtype='float64', mode='w+', shape=(nLats * nLons, len(retProf)))
-    del outFp
+        filenames - the two files
+        fileTimes - the analysis times of the two files
+        obsTimes  - the observation time of every location (or one for all),
+                    in the same units as fileTimes, e.g. seconds since epoch
+        see vert_interp_points for the other arguments
 
-    columnsPerProc = ((nLats * nLons) // NUM_PROCS) + 1
+        return: (location x pres) data array
+        '''
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
 
-    # process columns in parallel
-    procList = []
-    if rhProf is None:
-        rhProfLen = None
-    else:
-        rhProfLen = len(rhProf[0])
-    for i in range(NUM_PROCS): 
-        p = Process(target=_process_columns, args=(varName, tempFile, rhFile,
-                                                   outFile, len(tempProf[0]),
-                                                   rhProfLen, len(retProf), 
-                                                   i * columnsPerProc, 
-                                                   nLats, nLons, columnsPerProc))
-        procList.append(p)
-        p.start()
-
-    # wait for running child processes to complete
-    for p in procList:
-        p.join()
-        if p.is_alive():
-            print 'Error: process %d should be dead here' % p.pid
-
-    # get the output profile from our mem-mapped file
-    dataGrid = np.memmap(outFile, dtype='float64', mode='r', shape=(nLats * nLons, len(retProf)))
-
-    # remove tmpDir when done
-    shutil.rmtree(tmpDir)
-
-    dataGrid = dataGrid.T.reshape((len(retProf), nLats, nLons))
-
-    # TODO: might not need to return coordGrid. Just added this for data validation purposes
-    # Return (lat x lon) coord grid, (pres) pressure column, and (pres x lat x lon) data grid
-    return coordGrid, outPres, dataGrid
+        lats = np.asarray(lats, dtype='float64').ravel()
+        lons = np.asarray(lons, dtype='float64').ravel()
+
+        timeWeights = _time_weights(fileTimes, obsTimes, lats.shape)
+        if timeWeights is None:
+            return None
+
+        first = self._point_profiles(varName, filenames[0], lats, lons, outPres, horizontal,
+                                     fastSvp)
+        if first is None:
+            return None
+        second = self._point_profiles(varName, filenames[1], lats, lons, outPres, horizontal,
+                                      fastSvp, first[1])
+        if second is None:
+            return None
+
+        dataGrid = first[0]
+        dataGrid += timeWeights * (second[0] - dataGrid)
+
+        return np.ascontiguousarray(dataGrid.T)
+
+
+    def vert_interp_series(self, varName, lats, lons, filenames, pressure=None,
+                           horizontal='nearest', workers=None, pool=None, executor='processes',
+                           fastSvp=False):
+        '''Interpolate the profiles of a few locations (e.g. stations) in
+        every file of a time series. The files are read through their sidecar
+        message indices (see GribIndex), so only the needed messages are
+        decoded, and the files are processed in parallel.
+
+        filenames - the files of the time series
+        workers, pool, executor - see parallel.map_tasks
+        see vert_interp_points for the other arguments
+
+        return: (file x location x pres) data array
+        '''
+        varNames = self._check_point_var(varName)
+
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
+
+        lats = np.asarray(lats, dtype='float64').ravel()
+        lons = np.asarray(lons, dtype='float64').ravel()
+
+        tasks = [ (varName, varNames, filename, lats, lons, outPres, horizontal, fastSvp)
+                  for filename in filenames ]
+        profiles = parallel.map_tasks(_series_task, tasks, workers, pool, executor)
+
+        dataGrid = np.empty((len(filenames), len(lats), len(outPres)))
+        for i, prof in enumerate(profiles):
+            if prof is None:
+                return None
+            dataGrid[i] = prof.T
+
+        return dataGrid
+
+
+    def vert_interp_swath(self, varName, lats, lons, pressure=None, filename=None,
+                          horizontal='nearest', out=None, fastSvp=False):
+        '''Interpolate the temperature or mixing ratio profiles of every pixel
+        of a swath. A swath only touches a few thousand GDAS cells, so the
+        profiles are computed once per distinct cell (using the cell latitude
+        for the extrapolation above the GDAS levels) and scattered back to the
+        pixels.
+
+        varName    - the name of the measurement we are looking to interpolate
+        lats, lons - (rows x cols) latitude and longitude of the pixels
+        pressure   - the output pressure vector
+        filename   - the file we want to read input profiles from
+        horizontal - 'nearest' cell, or 'bilinear' to blend the output
+                     profiles of the four cells around every pixel. Note that
+                     vert_interp_points blends the input temperature and
+                     humidity instead, and since the mixing ratio is not
+                     linear in temperature, the two can differ noticeably
+                     for mixing ratio.
+        out        - optional preallocated (pres x rows x cols) output array,
+                     which may be of a smaller type such as float32
+        fastSvp    - see vert_interp_grid
+
+        return: (pres x rows x cols) data array
+        '''
+        if filename is None:
+            print 'vert_interp_swath: no input data provided'
+            return None
+
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+
+        geometry = self._get_grib(filename).getGeometry()
+        cells, inverse, weights = self._swath_cells(geometry, lats.ravel(), lons.ravel(),
+                                                    horizontal)
+
+        # interpolate the distinct cells only
+        profiles = self._cell_profiles(varName, filename, geometry, cells, outPres, fastSvp)
+        if profiles is None:
+            return None
+
+        return _scatter_profiles(profiles[0], inverse, weights, lats.shape, out)
+
+
+    def vert_interp_swath_time(self, varName, lats, lons, filenames, fileTimes, obsTimes,
+                               pressure=None, horizontal='nearest', out=None, fastSvp=False):
+        '''Interpolate the profiles of every pixel of a swath observed between
+        the times of two GDAS files. The distinct cells of both files are
+        interpolated with the same InterpolationPlan, and blended in time
+        while they are scattered back to the pixels.
+
+        filenames - the two files, on the same grid
+        fileTimes - the analysis times of the two files
+        obsTimes  - (rows x cols) observation time of every pixel (or one for
+                    all), in the same units as fileTimes
+        see vert_interp_swath for the other arguments
+
+        return: (pres x rows x cols) data array
+        '''
+        outPres = _make_out_pres(pressure)
+        if outPres is None:
+            return None
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+
+        timeWeights = _time_weights(fileTimes, obsTimes, lats.shape)
+        if timeWeights is None:
+            return None
+        timeWeights = timeWeights.ravel()
+
+        geometry = self._get_grib(filenames[0]).getGeometry()
+        cells, inverse, weights = self._swath_cells(geometry, lats.ravel(), lons.ravel(),
+                                                    horizontal)
+
+        first = self._cell_profiles(varName, filenames[0], geometry, cells, outPres, fastSvp)
+        if first is None:
+            return None
+        second = self._cell_profiles(varName, filenames[1], geometry, cells, outPres, fastSvp,
+                                     first[1])
+        if second is None:
+            return None
+
+        # the cells of the second file follow those of the first, and every
+        # pixel blends the stencils of both
+        if weights is None:
+            weights = np.ones(inverse.shape)
+        cellProfs = np.hstack((first[0], second[0]))
+        inverse = np.vstack((inverse, inverse + len(cells)))
+        weights = np.vstack((weights * (1.0 - timeWeights), weights * timeWeights))
+
+        return _scatter_profiles(cellProfs, inverse, weights, lats.shape, out)
+
+
+    def vert_interp_ozone(self, filename, lat, lon, month, horizontal='nearest'):
+        '''Given an input profile extracted using the filename, latitude,
+        and longitude, compute the extended ozone profile for
+        a location in the given month. See vert_interp for horizontal.
+        '''
+        productKey = _product_key('vert_interp_ozone', filename, lat, lon, month, horizontal)
+        cached = _get_product(productKey)
+        if cached is not None:
+            return cached
+
+        o3Pres, o3Prof = self._get_grib(filename).readDataLatLon('O3MR', lat, lon, horizontal)
+
+        adj_ozone = _interp_ozone(np.asarray(o3Prof)[:, np.newaxis], o3Pres, [lat], month)
+        if adj_ozone is None:
+            return None
+
+        retProf = []
+        for i in xrange(len(adj_ozone)):
+            retProf.append([_101_pressure_levels[i], float(adj_ozone[i, 0])])
+
+        return _put_product(productKey, retProf)
+
+
+    def vert_interp_ozone_grid(self, filename, month, workers=None, chunkSize=None, pool=None,
+                               executor='processes'):
+        '''Compute the 101-level ozone profile of every (lat,lon) column of
+        the file for the given month.
+
+        workers, chunkSize, pool, executor - see vert_interp_grid
+
+        return: (lat x lon x 2) coord grid, output pressure column, and
+                (pres x lat x lon) ozone grid
+        '''
+        productKey = _product_key('vert_interp_ozone_grid', filename, month)
+        cached = _get_product(productKey)
+        if cached is not None:
+            return cached
+
+        coordGrid, o3Pres, o3Prof = self._get_grib(filename).readDataAllLatLon('O3MR')
+        if _ozone_anchors(o3Pres) is None:
+            return None
+
+        if workers is None:
+            workers = NUM_PROCS
+
+        nLats = len(coordGrid)
+        nLons = len(coordGrid[0])
+        nOut = len(_101_pressure_levels)
+
+        inputs = {}
+        inputs['lats'] = coordGrid[:, :, 0].ravel()
+        inputs['o3'] = o3Prof.reshape((len(o3Prof), nLats * nLons))
+
+        dataGrid = parallel.map_columns(_ozone_kernel, (o3Pres, month), inputs, nOut,
+                                        workers, chunkSize, pool, executor, nLons)
+
+        return _put_product(productKey, (coordGrid, list(_101_pressure_levels),
+                                         dataGrid.reshape((nOut, nLats, nLons))))
+
+
+    def _get_grid_inputs(self, varName, pressure, filename, tempProf, rhProf, fastSvp=False):
+        # Read the input grids and set up the arguments of _grid_kernel
+        if varName != 'Temperature' and varName != 'Relative humidity':
+            print 'Invalid varName %s' % varName
+            exit(1)
+
+        inputDict = self._get_input_profs(varName, 0, 0, filename, tempProf, rhProf, True)
+        if inputDict is None:
+            return None
+
+        coordGrid = inputDict['coordGrid']
+        tempPres = inputDict['tempPres']
+        rhPres = inputDict['rhPres']
+        tempProf = inputDict['tempProf']
+        rhProf = inputDict['rhProf']
+
+        if pressure is None:
+            outPres = list(_101_pressure_levels)
+        else:
+            outPres = pressure
+
+        # temp prof should always have something in it now
+        if tempProf is None:
+            return None
+
+        nCols = len(coordGrid) * len(coordGrid[0])
+
+        # flatten our input profiles to (levels, columns) to make them easier to process
+        inputs = {}
+        inputs['lats'] = coordGrid[:, :, 0].ravel()
+        inputs['temp'] = np.asarray(tempProf).reshape((len(tempProf), nCols))
+        if rhProf is not None:
+            inputs['rh'] = np.asarray(rhProf).reshape((len(rhProf), nCols))
+
+        return coordGrid, outPres, (varName, tempPres, rhPres, outPres, fastSvp), inputs
+
+
+    def vert_interp_grid(self, varName, pressure=None, filename=None, tempProf=None, rhProf=None,
+                         workers=None, chunkSize=None, pool=None, executor='processes',
+                         fastSvp=False):
+        '''Interpolate every (lat,lon) column of the file, or of the given
+        tempProf/rhProf (pressure list, (levels, lat, lon) grid) pairs.
+
+        workers   - number of worker processes or threads, NUM_PROCS by
+                    default. If that is None, see parallel.choose_workers
+        chunkSize - number of columns per worker task, see parallel.map_columns.
+                    Tasks are always whole latitude bands.
+        pool      - parallel.WorkerPool to run on instead of starting one for
+                    this call (or using the parallel session pool)
+        executor  - 'processes', or 'threads' to run latitude-band tiles on a
+                    thread pool within this process
+        fastSvp   - convert relative humidity with the table-driven saturation
+                    vapor pressure (see thermo.svp)
+
+        return: (lat x lon x 2) coord grid, output pressure column, and
+                (pres x lat x lon) data grid
+        '''
+        # only results computed from the file alone are cached
+        productKey = None
+        if tempProf is None and rhProf is None:
+            productKey = _product_key('vert_interp_grid', filename, varName, pressure, fastSvp)
+        cached = _get_product(productKey)
+        if cached is not None:
+            return cached
+
+        gridInputs = self._get_grid_inputs(varName, pressure, filename, tempProf, rhProf, fastSvp)
+        if gridInputs is None:
+            return None
+        coordGrid, outPres, args, inputs = gridInputs
+
+        if workers is None:
+            workers = NUM_PROCS
+
+        nLats = len(coordGrid)
+        nLons = len(coordGrid[0])
+        nOut = len(np.asarray(outPres, dtype='float64').ravel())
+
+        # process columns in parallel
+        dataGrid = parallel.map_columns(_grid_kernel, args, inputs, nOut,
+                                        workers, chunkSize, pool, executor, nLons)
+
+        dataGrid = dataGrid.reshape((nOut, nLats, nLons))
+
+        # TODO: might not need to return coordGrid. Just added this for data validation purposes
+        # Return (lat x lon) coord grid, (pres) pressure column, and (pres x lat x lon) data grid
+        return _put_product(productKey, (coordGrid, outPres, dataGrid))
+
+
+    def vert_interp_grid_time(self, varName, filenames, fileTimes, obsTimes, pressure=None,
+                              workers=None, chunkSize=None, pool=None, executor='processes',
+                              fastSvp=False):
+        '''Interpolate every (lat,lon) column of two GDAS files and blend
+        them linearly in time. Both files must have the same levels, so they
+        share the (cached) InterpolationPlan.
+
+        filenames - the two files, on the same grid
+        fileTimes - the analysis times of the two files
+        obsTimes  - (lat x lon) observation time of every column (or one for
+                    all), in the same units as fileTimes
+        see vert_interp_grid for the other arguments
+
+        return: (lat x lon x 2) coord grid, output pressure column, and
+                (pres x lat x lon) data grid
+        '''
+        if workers is None:
+            workers = NUM_PROCS
+
+        # check the grids and times before decoding anything
+        geometry = self._get_grib(filenames[0]).getGeometry()
+        if not self._get_grib(filenames[1]).getGeometry().sameGrid(geometry):
+            print 'Error: %s is on a different grid' % filenames[1]
+            return None
+
+        timeWeights = _time_weights(fileTimes, obsTimes, geometry.shape)
+        if timeWeights is None:
+            return None
+
+        dataGrids = []
+        for filename in filenames:
+            gridInputs = self._get_grid_inputs(varName, pressure, filename, None, None, fastSvp)
+            if gridInputs is None:
+                return None
+            coordGrid, outPres, args, inputs = gridInputs
+
+            # the tempPres and rhPres arguments must match
+            if dataGrids and not (np.array_equal(args[1], firstArgs[1]) and
+                                  np.array_equal(args[2], firstArgs[2])):
+                print 'Error: input files have different pressure levels'
+                return None
+            firstArgs = args
+
+            nLats = len(coordGrid)
+            nLons = len(coordGrid[0])
+            nOut = len(np.asarray(outPres, dtype='float64').ravel())
+
+            dataGrid = parallel.map_columns(_grid_kernel, args, inputs, nOut,
+                                            workers, chunkSize, pool, executor, nLons)
+            dataGrids.append(dataGrid.reshape((nOut, nLats, nLons)))
+
+        dataGrid = dataGrids[0]
+        dataGrid += timeWeights * (dataGrids[1] - dataGrid)
+
+        return coordGrid, outPres, dataGrid
+
+
+    def calibrate_grid(self, filename, varName='Temperature', pressure=None):
+        '''Time vert_interp_grid on the given file for a range of worker and
+        chunk counts, and store the fastest settings for this host, see
+        parallel.calibrate.
+        '''
+        gridInputs = self._get_grid_inputs(varName, pressure, filename, None, None)
+        if gridInputs is None:
+            return None
+        coordGrid, outPres, args, inputs = gridInputs
+
+        nOut = len(np.asarray(outPres, dtype='float64').ravel())
+        return parallel.calibrate(_grid_kernel, args, inputs, nOut)
+
+
+    def vert_interp_all(self, filename, month, workers=None, chunkSize=None, pool=None,
+                        executor='processes', fastSvp=False):
+        '''Compute the 101-level temperature, mixing ratio and ozone grids of
+        a file in one pass, decoding each GDAS variable only once.
+
+        filename - the file we want to read input profiles from
+        month    - the month used for the ozone climatology
+        workers, chunkSize, pool, executor, fastSvp - see vert_interp_grid
+
+        return: (lat x lon x 2) coord grid, output pressure column, and the
+                (pres x lat x lon) temperature, mixing ratio and ozone grids
+        '''
+        productKey = _product_key('vert_interp_all', filename, month, fastSvp)
+        cached = _get_product(productKey)
+        if cached is not None:
+            return cached
+
+        cubes = self._get_grib(filename).readVariables(['Temperature', 'Relative humidity', 'O3MR'])
+        coordGrid, tempPres, tempProf = cubes['Temperature']
+        _, rhPres, rhProf = cubes['Relative humidity']
+        _, o3Pres, o3Prof = cubes['O3MR']
+
+        # match every rh level to the temperature at the same pressure level
+        alignment = _align_levels(rhPres, tempPres)
+        if alignment is None or _ozone_anchors(o3Pres) is None:
+            return None
+
+        if workers is None:
+            workers = NUM_PROCS
+
+        nLats = len(coordGrid)
+        nLons = len(coordGrid[0])
+        nCols = nLats * nLons
+        nOut = len(_101_pressure_levels)
+
+        inputs = {}
+        inputs['lats'] = coordGrid[:, :, 0].ravel()
+        inputs['temp'] = tempProf.reshape((len(tempProf), nCols))
+        inputs['rh'] = rhProf.reshape((len(rhProf), nCols))
+        inputs['o3'] = o3Prof.reshape((len(o3Prof), nCols))
+
+        args = (tempPres, rhPres, o3Pres, alignment, month, fastSvp)
+        dataGrid = parallel.map_columns(_all_kernel, args, inputs, 3 * nOut,
+                                        workers, chunkSize, pool, executor, nLons)
+
+        dataGrid = dataGrid.reshape((3, nOut, nLats, nLons))
+        return _put_product(productKey, (coordGrid, list(_101_pressure_levels),
+                                         dataGrid[0], dataGrid[1], dataGrid[2]))
+
+
+# Interpolator behind the module-level functions, which are kept for
+# compatibility. Threaded callers should each create their own Interpolator.
+_interpolator = Interpolator()
+
+
+def vert_interp(varName, lat, lon, pressure=None, filename=None, tempProf=None, rhProf=None,
+                horizontal='nearest'):
+    '''See Interpolator.vert_interp.'''
+    return _interpolator.vert_interp(varName, lat, lon, pressure, filename, tempProf, rhProf,
+                                     horizontal)
+
+
+def vert_interp_points(varName, lats, lons, pressure=None, filename=None, fastSvp=False,
+                       horizontal='nearest'):
+    '''See Interpolator.vert_interp_points.'''
+    return _interpolator.vert_interp_points(varName, lats, lons, pressure, filename, fastSvp,
+                                            horizontal)
+
+
+def vert_interp_series(varName, lats, lons, filenames, pressure=None, horizontal='nearest',
+                       workers=None, pool=None, executor='processes', fastSvp=False):
+    '''See Interpolator.vert_interp_series.'''
+    return _interpolator.vert_interp_series(varName, lats, lons, filenames, pressure, horizontal,
+                                            workers, pool, executor, fastSvp)
+
+
+def vert_interp_swath(varName, lats, lons, pressure=None, filename=None, horizontal='nearest',
+                      out=None, fastSvp=False):
+    '''See Interpolator.vert_interp_swath.'''
+    return _interpolator.vert_interp_swath(varName, lats, lons, pressure, filename, horizontal,
+                                           out, fastSvp)
+
+
+def vert_interp_points_time(varName, lats, lons, filenames, fileTimes, obsTimes, pressure=None,
+                            fastSvp=False, horizontal='nearest'):
+    '''See Interpolator.vert_interp_points_time.'''
+    return _interpolator.vert_interp_points_time(varName, lats, lons, filenames, fileTimes,
+                                                 obsTimes, pressure, fastSvp, horizontal)
+
+
+def vert_interp_swath_time(varName, lats, lons, filenames, fileTimes, obsTimes, pressure=None,
+                           horizontal='nearest', out=None, fastSvp=False):
+    '''See Interpolator.vert_interp_swath_time.'''
+    return _interpolator.vert_interp_swath_time(varName, lats, lons, filenames, fileTimes,
+                                                obsTimes, pressure, horizontal, out, fastSvp)
+
+
+def vert_interp_ozone(filename, lat, lon, month, horizontal='nearest'):
+    '''See Interpolator.vert_interp_ozone.'''
+    return _interpolator.vert_interp_ozone(filename, lat, lon, month, horizontal)
+
+
+def vert_interp_ozone_grid(filename, month, workers=None, chunkSize=None, pool=None,
+                           executor='processes'):
+    '''See Interpolator.vert_interp_ozone_grid.'''
+    return _interpolator.vert_interp_ozone_grid(filename, month, workers, chunkSize, pool,
+                                                executor)
+
+
+def vert_interp_grid(varName, pressure=None, filename=None, tempProf=None, rhProf=None,
+                     workers=None, chunkSize=None, pool=None, executor='processes',
+                     fastSvp=False):
+    '''See Interpolator.vert_interp_grid.'''
+    return _interpolator.vert_interp_grid(varName, pressure, filename, tempProf, rhProf,
+                                          workers, chunkSize, pool, executor, fastSvp)
+
+
+def vert_interp_grid_time(varName, filenames, fileTimes, obsTimes, pressure=None, workers=None,
+                          chunkSize=None, pool=None, executor='processes', fastSvp=False):
+    '''See Interpolator.vert_interp_grid_time.'''
+    return _interpolator.vert_interp_grid_time(varName, filenames, fileTimes, obsTimes, pressure,
+                                               workers, chunkSize, pool, executor, fastSvp)
+
+
+def vert_interp_all(filename, month, workers=None, chunkSize=None, pool=None,
+                    executor='processes', fastSvp=False):
+    '''See Interpolator.vert_interp_all.'''
+    return _interpolator.vert_interp_all(filename, month, workers, chunkSize, pool, executor,
+                                         fastSvp)
+
+
+def calibrate_grid(filename, varName='Temperature', pressure=None):
+    '''See Interpolator.calibrate_grid.'''
+    return _interpolator.calibrate_grid(filename, varName, pressure)
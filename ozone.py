@@ -128,96 +128,116 @@ ozmr[:,2,1] = [0.60245,0.21936,0.27680,0.48346,0.76740, \
     0.02887,0.02768,0.02642,0.02518,0.02395,0.02274,0.02241,0.02241]
 
 
-def _time_interp(rlat, month, omr):
-    omix = np.zeros((nl))
-    nmon = month
-    if rlat < 0:
-        nmon += 6
-    if nmon > 12:
-        nmon -= 12
-
-    imon = abs(nmon - 7)
-    wt1 = float(imon) / 6.0
-    wt2 = 1.0 - wt1
-    for i in xrange(nl):
-        omix[i] = wt1*omr[i,0] + wt2*omr[i,1]
-    return omix
+def _zone_weights(alat):
+    '''Return the (N, nz) weights of the tropical, midlatitude and subarctic
+    profiles for absolute latitudes alat, clipped to [tlat[0], tlat[2]].
+    '''
+    wts = np.zeros((len(alat), nz))
+
+    # spatial interpolation between the two nearest zones
+    jl1 = (alat > tlat[1]).astype(int)
+    wt1 = (np.take(tlat, jl1 + 1) - alat) / 25.0 # ensures 0 <= wt1 <= 1
+
+    rows = np.arange(len(alat))
+    wts[rows, jl1] = wt1
+    wts[rows, jl1 + 1] += 1.0 - wt1
+    return wts
+
+
+def _month_index(rlat, month):
+    '''Return |nmon - 7| for each latitude and month, where nmon is the
+    month shifted by 6 in the southern hemisphere. The winter profile gets a
+    weight of imon / 6.
+    '''
+    nmon = np.where(rlat < 0, month + 6, month)
+    nmon = np.where(nmon > 12, nmon - 12, nmon)
+    return np.abs(nmon - 7)
+
+
+def clozo101_batch(lats, months):
+    '''Return the (N, 101) climatological ozone profiles (ppmv) for arrays of
+    N latitudes and months (1...12), broadcast against each other. Modeled
+    after clozo101.f
+    '''
+    lats, months = np.broadcast_arrays(np.asarray(lats, dtype=float).ravel(),
+                                       np.asarray(months, dtype=int).ravel())
+
+    # tropical and subarctic profiles are used as is beyond tlat[0] and
+    # tlat[2], so no spatial interpolation needs to be done there
+    alat = np.clip(np.abs(lats), tlat[0], tlat[2])
+    imon = _month_index(lats, months)
+
+    # the profile only depends on the clipped latitude and the month index,
+    # so only compute each distinct combination once
+    key = imon * 100.0 + alat
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+    # weights of the nz * ns profiles in ozmr: spatial interpolation between
+    # zones, then temporal interpolation between winter and summer
+    wt1 = imon[first] / 6.0
+    seasonWts = np.column_stack((wt1, 1.0 - wt1))
+    zoneWts = _zone_weights(alat[first])
+    wts = (zoneWts[:, :, np.newaxis] * seasonWts[:, np.newaxis, :]).reshape((len(first), nz * ns))
+
+    profiles = np.dot(wts, ozmr.reshape((nl, nz * ns)).T)
+
+    return profiles[inverse]
+
 
 def clozo101(rlat, month):
-    omr  = np.zeros((nl, ns))
-    omix = np.zeros((nl))
-    alat = abs(rlat)
-
-    # If we are in a tropical zone, no spatial or temporal interpolation needs 
-    # to be done. Simply get the tropical profile and return it.
-    if alat <= 15:
-        for i in xrange(nl):
-            omix[i] = ozmr(i, 1, 1)
-        return omix
-
-    # If we are firmly in a subarctic zone, get the summer and winter profiles
-    # and interpolate between them based on the month given.
-    elif alat >= 65:
-        jl = 3
-        kk = 2
-        for k in xrange(kk):
-            for i in xrange(nl):
-                omr[i, k] = ozmr[i, jl, k]
-        
-        omix = _time_interp(rlat, month, omr)
-        return omix
-             
-    # Otherwise, need to perform both temporal and spatial interpolation
-    else:
-        jl1 = 0
-        if alat > 40:
-            jl1 = 1
-        jl2 = jl1 + 1
-
-        # do spatial interpolation
-        wt1 = (tlat[jl2] - alat) / 25.0 # ensures 0 <= wt1 <= 1
-        wt2 = 1.0 - wt1
-        for k in range(ns):
-            for i in range(nl):
-                or1 = ozmr[i, jl1, k]
-                or2 = ozmr[i, jl2, k]
-                omr[i, k] = wt1*or1 + wt2*or2
-
-        # do temporal interpolation
-        omix = _time_interp(rlat, month, omr)
-        return omix
+    '''Return the 101-level climatological ozone profile (ppmv) at latitude
+    rlat in the given month, see clozo101_batch.
+    '''
+    return clozo101_batch([rlat], [month])[0]
+
+
+# GDAS ozone levels (mb) and the 101-level indices they replace
+gdas_levels = [10, 20, 30, 50, 70, 100]
+gdas_anchors = gdaspp[1:-1]
+
+
+def _adjo3_weights():
+    '''For every level strictly between two consecutive gdaspp levels, return
+    the indices of the bracketing gdaspp levels and the log-pressure weight of
+    the lower one.
+    '''
+    levs = []
+    upper = []
+    lower = []
+    wts = []
+    for intpt in xrange(len(gdaspp) - 1):
+        m = gdaspp[intpt]
+        n = gdaspp[intpt + 1]
+        dptot = math.log(pp[n]) - math.log(pp[m])
+        for jj in xrange(m + 1, n):
+            levs.append(jj)
+            upper.append(m)
+            lower.append(n)
+            wts.append((math.log(pp[jj]) - math.log(pp[m])) / dptot)
+
+    return levs, upper, lower, np.array(wts)
+
+_adj_levs, _adj_upper, _adj_lower, _adj_wts = _adjo3_weights()
+
+
+def adjo3_batch(ozone, gdas_o3):
+    '''Adjust (N, 101) climatological ozone profiles to GDAS ozone: the
+    (N, 6) values of gdas_o3 replace the gdas_anchors levels, and the levels
+    between gdaspp[0] and gdaspp[-1] are log-pressure interpolated between
+    them. Modeled after adjo3.f
+    '''
+    adj_ozone = np.array(ozone, dtype=float, ndmin=2)
+    adj_ozone[:, gdas_anchors] = gdas_o3
+
+    top = adj_ozone[:, _adj_upper]
+    adj_ozone[:, _adj_levs] = top + (adj_ozone[:, _adj_lower] - top) * _adj_wts
 
-def adjo3(ozone, gdas_prof):
-    adj_ozone = np.zeros((plev))
-
-    for kk in range(plev):
-        adj_ozone[kk] = ozone[kk]
-
-    adj_ozone[20] = gdas_prof[0][1]
-    adj_ozone[26] = gdas_prof[1][1]
-    adj_ozone[29] = gdas_prof[2][1]
-    adj_ozone[35] = gdas_prof[3][1]
-    adj_ozone[39] = gdas_prof[4][1]
-    adj_ozone[44] = gdas_prof[5][1]
-    
-    levc = 1
-    intpt = 0
-    toplev = strat_top - 2
-    botlev = strat_bot + 2
-    
-    for kk in range(toplev, botlev + 1):
-
-        if gdaspp[levc] == kk:
-            do3 = adj_ozone[gdaspp[levc]] - adj_ozone[gdaspp[intpt]]
-            dptot = math.log(pp[gdaspp[levc]]) - math.log(pp[gdaspp[intpt]])
-
-            m = gdaspp[intpt] + 1
-            n = gdaspp[levc] - 1
-            for jj in range(m, n + 1):
-                dp = math.log(pp[jj]) - math.log(pp[gdaspp[intpt]])
-                adj_ozone[jj] = adj_ozone[gdaspp[intpt]] + (do3 * (dp / dptot))
-
-            levc += 1
-            intpt += 1
-                
     return adj_ozone
+
+
+def adjo3(ozone, gdas_prof):
+    '''Adjust one climatological ozone profile to the first 6 (pressure,
+    ozone) pairs of gdas_prof, see adjo3_batch.
+    '''
+    gdas_o3 = [ gdas_prof[i][1] for i in xrange(len(gdas_anchors)) ]
+    return adjo3_batch(ozone, [gdas_o3])[0]
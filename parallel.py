@@ -0,0 +1,519 @@
+'''
+Worker pool used to spread column-wise kernels (see gdas_interp) over
+several processes.
+
+Input and output cubes are exchanged through shared memory buffers backed by
+/dev/shm, so nothing is written to disk. Workers attach to the buffers by
+name, and the columns are handed out in small chunks so that a slow worker
+does not hold up the others.
+
+Kernels which spend their time in large NumPy operations (which release the
+GIL) can instead run on threads over views of the input arrays, with
+executor='threads', which avoids the copies into shared memory and the
+worker processes altogether.
+
+By default every call starts and stops its own pool. A WorkerPool keeps the
+worker processes (and everything they have loaded or cached, such as the
+interpolation plans) alive between calls, either as a context manager:
+
+    with WorkerPool(16) as pool:
+        vert_interp_grid('Temperature', filename=f, pool=pool)
+
+or as the module-level session used by every call that is not given a pool:
+
+    parallel.start_session(16)
+    ...
+    parallel.end_session()
+'''
+
+import os
+import json
+import time
+import atexit
+import signal
+import socket
+import numpy as np
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+from tempfile import mkstemp
+
+# ramdisk used for the shared buffers, when the system has one
+SHM_DIR = '/dev/shm'
+
+# number of chunks each worker gets on average, for dynamic scheduling
+CHUNKS_PER_WORKER = 4
+
+# fewer columns than this per worker are not worth a process
+MIN_COLUMNS_PER_WORKER = 2048
+
+# where calibrate stores the best settings for each host
+TUNING_FILE = os.environ.get('GDAS_INTERP_TUNING',
+                             os.path.join(os.path.expanduser('~'), '.gdas_interp_tuning.json'))
+
+
+def _shm_dir():
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return None
+
+
+class SharedArray(object):
+    """
+    A float64 array in shared memory which other processes can attach to
+    by name (see SharedArray.desc and attach).
+    """
+
+    def __init__(self, shape):
+        fd, self.path = mkstemp(prefix='gdas_interp_', suffix='.dat', dir=_shm_dir())
+        os.close(fd)
+        self.shape = tuple(shape)
+        self.array = np.memmap(self.path, dtype='float64', mode='w+', shape=self.shape)
+
+
+    def desc(self):
+        '''Return the (picklable) description used to attach to this array.'''
+        return (self.path, self.shape)
+
+
+    def unlink(self):
+        '''Remove the name of the buffer. Processes which are already
+        attached, including this one, can still use the array.
+        '''
+        if self.path is not None:
+            os.unlink(self.path)
+            self.path = None
+
+
+def share(data):
+    '''Copy data into a new SharedArray.'''
+    shared = SharedArray(np.shape(data))
+    shared.array[:] = data
+    return shared
+
+
+def attach(desc):
+    '''Map the SharedArray described by desc into this process.'''
+    path, shape = desc
+    return np.memmap(path, dtype='float64', mode='r+', shape=shape)
+
+
+def _run_chunk(task):
+    '''Run kernel on columns [start, end) of the shared input arrays and store
+    the result in the same columns of the shared output array.
+    '''
+    kernel, args, inDescs, outDesc, start, end = task
+
+    cols = {}
+    for name, desc in inDescs.items():
+        cols[name] = attach(desc)[..., start:end]
+
+    attach(outDesc)[:, start:end] = kernel(args, cols)
+    return start, end
+
+
+def _parse_cpu_list(cpuList):
+    # e.g. "0-3,8,10-11"
+    count = 0
+    for part in cpuList.strip().split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            count += int(last) - int(first) + 1
+        elif part:
+            count += 1
+    return count
+
+
+def _affinity_cpus():
+    '''Number of CPUs this process may run on, or None if unknown.'''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('Cpus_allowed_list:'):
+                return _parse_cpu_list(line.split(':', 1)[1])
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def _quota_cpus():
+    '''CPU limit from the cgroup quota (v2 or v1), or None if unlimited.'''
+    try:
+        quota, period = open('/sys/fs/cgroup/cpu.max').read().split()
+        if quota != 'max':
+            return float(quota) / float(period)
+        return None
+    except (IOError, ValueError):
+        pass
+    try:
+        quota = int(open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us').read())
+        period = int(open('/sys/fs/cgroup/cpu/cpu.cfs_period_us').read())
+        if quota > 0 and period > 0:
+            return float(quota) / period
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    '''Return the number of CPUs available to this process, respecting the
+    CPU affinity mask and cgroup quota.
+    '''
+    cpus = cpu_count()
+
+    affinity = _affinity_cpus()
+    if affinity:
+        cpus = min(cpus, affinity)
+
+    quota = _quota_cpus()
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+
+    return cpus
+
+
+def _host_key():
+    return '%s:%d' % (socket.gethostname(), available_cpus())
+
+
+def _load_tuning():
+    try:
+        return json.load(open(TUNING_FILE))
+    except (IOError, ValueError):
+        return {}
+
+
+# calibrated settings of this host, loaded once per process, see host_tuning
+_host_tuning = None
+_host_tuning_loaded = False
+
+def host_tuning():
+    '''Return the calibrated settings of this host in TUNING_FILE, or None.
+    The file is only read once per process.
+    '''
+    global _host_tuning, _host_tuning_loaded
+    if not _host_tuning_loaded:
+        _host_tuning = _load_tuning().get(_host_key())
+        _host_tuning_loaded = True
+    return _host_tuning
+
+
+def choose_workers(nCols, tuning=None):
+    '''Pick a number of workers for nCols columns: the calibrated setting for
+    this host if there is one, otherwise one per available CPU, but without
+    giving any worker fewer than MIN_COLUMNS_PER_WORKER columns.
+
+    tuning - the settings of this host, by default see host_tuning
+    '''
+    if tuning is None:
+        tuning = host_tuning()
+    if tuning is not None:
+        cpus = tuning['workers']
+        minCols = tuning['minColumns']
+    else:
+        cpus = available_cpus()
+        minCols = MIN_COLUMNS_PER_WORKER
+
+    return max(1, min(cpus, nCols // minCols))
+
+
+def choose_chunk_size(nCols, workers, tuning=None):
+    '''Pick the number of columns per task so that each worker gets about
+    CHUNKS_PER_WORKER tasks (or the calibrated number for this host).
+
+    tuning - the settings of this host, by default see host_tuning
+    '''
+    chunks = CHUNKS_PER_WORKER
+    if tuning is None:
+        tuning = host_tuning()
+    if tuning is not None:
+        chunks = tuning['chunksPerWorker']
+
+    return nCols // (workers * chunks) + 1
+
+
+def calibrate(kernel, args, inputs, nOut, workerCounts=None, chunkCounts=(1, 2, 4, 8, 16)):
+    '''Time map_columns on the given (representative) inputs for a range of
+    worker and chunk counts, and store the fastest settings for this host in
+    TUNING_FILE, where choose_workers and choose_chunk_size pick them up.
+
+    workerCounts - worker counts to try, by default powers of two up to the
+                   number of available CPUs
+    chunkCounts  - numbers of tasks per worker to try
+
+    return: the stored settings
+    '''
+    cpus = available_cpus()
+    if workerCounts is None:
+        workerCounts = [1]
+        while workerCounts[-1] * 2 <= cpus:
+            workerCounts.append(workerCounts[-1] * 2)
+        if workerCounts[-1] != cpus:
+            workerCounts.append(cpus)
+
+    nCols = np.shape(inputs.values()[0])[-1]
+
+    best = None
+    for workers in workerCounts:
+        with WorkerPool(workers) as pool:
+            for chunks in chunkCounts:
+                chunkSize = nCols // (workers * chunks) + 1
+                # first run warms up the workers
+                map_columns(kernel, args, inputs, nOut, workers, chunkSize, pool)
+                t = time.time()
+                map_columns(kernel, args, inputs, nOut, workers, chunkSize, pool)
+                elapsed = time.time() - t
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, workers, chunks)
+
+    elapsed, workers, chunks = best
+    settings = {'workers': workers,
+                'chunksPerWorker': chunks,
+                'minColumns': max(1, nCols // workers)}
+
+    global _host_tuning, _host_tuning_loaded
+    tuning = _load_tuning()
+    tuning[_host_key()] = settings
+
+    # write to a temporary file first, so a crash or another host sharing
+    # the file never leaves it truncated
+    directory = os.path.dirname(os.path.abspath(TUNING_FILE))
+    fd, tmpPath = mkstemp(dir=directory, suffix='.json')
+    try:
+        fp = os.fdopen(fd, 'w')
+        json.dump(tuning, fp, indent=2, sort_keys=True)
+        fp.close()
+        os.rename(tmpPath, TUNING_FILE)
+    except Exception:
+        os.unlink(tmpPath)
+        raise
+
+    _host_tuning = settings
+    _host_tuning_loaded = True
+
+    return settings
+
+
+def _init_worker():
+    # leave interrupts to the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class WorkerPool(object):
+    """
+    Long-lived pool of worker processes for map_columns. Close it when done,
+    or use it as a context manager.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = Pool(workers, _init_worker)
+
+
+    def map_columns(self, kernel, args, inputs, nOut, chunkSize=None):
+        '''See map_columns.'''
+        return map_columns(kernel, args, inputs, nOut, self.workers, chunkSize, self)
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+    def terminate(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.terminate()
+
+
+# pool shared by every call which is not given one, see start_session
+_session = None
+
+def start_session(workers):
+    '''Start the module-level WorkerPool, replacing any running one.'''
+    global _session
+    end_session()
+    _session = WorkerPool(workers)
+    return _session
+
+
+def end_session():
+    '''Stop the module-level WorkerPool, if any.'''
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def get_session():
+    '''Return the module-level WorkerPool, or None.'''
+    return _session
+
+atexit.register(end_session)
+
+
+def chunk_bounds(nCols, chunkSize):
+    '''Split nCols columns into [start, end) chunks of chunkSize columns.'''
+    return [ (i, min(i + chunkSize, nCols)) for i in xrange(0, nCols, chunkSize) ]
+
+
+def _map_threads(kernel, args, inputs, nOut, workers, chunkSize):
+    # Run the chunks on a pool of threads, each writing straight into its
+    # columns of the output array
+    nCols = np.shape(inputs.values()[0])[-1]
+    out = np.empty((nOut, nCols))
+
+    def run_chunk(bounds):
+        start, end = bounds
+        cols = {}
+        for name, data in inputs.items():
+            cols[name] = data[..., start:end]
+        out[:, start:end] = kernel(args, cols)
+
+    pool = ThreadPool(workers)
+    try:
+        for _ in pool.imap_unordered(run_chunk, chunk_bounds(nCols, chunkSize)):
+            pass
+    finally:
+        pool.close()
+        pool.join()
+
+    return out
+
+
+def map_columns(kernel, args, inputs, nOut, workers=None, chunkSize=None, pool=None,
+                executor='processes', align=1):
+    '''Apply kernel to every column of the inputs in parallel.
+
+    kernel    - (for processes, picklable module level) function called as
+                kernel(args, cols), where cols maps the names of inputs to
+                the current chunk of columns. It must return the
+                (nOut, chunk) output columns.
+    args      - picklable arguments passed through to kernel
+    inputs    - dict of name -> array, with columns along the last axis
+    nOut      - number of output values per column
+    workers   - number of worker processes or threads, ignored when running
+                on an existing pool. By default see choose_workers
+    chunkSize - number of columns per task, by default see choose_chunk_size
+    pool      - WorkerPool to run on. By default the session pool is used if
+                one was started, otherwise a pool is started for this call.
+    executor  - 'processes' or 'threads'
+    align     - chunk sizes are rounded up to a multiple of align columns,
+                e.g. to split a grid into bands of whole latitude rows
+
+    return: (nOut, nCols) output array
+    '''
+    if executor not in ('processes', 'threads'):
+        raise ValueError('Unknown executor %r' % executor)
+
+    if pool is None and executor == 'processes':
+        pool = _session
+    if pool is not None:
+        workers = pool.workers
+
+    nCols = np.shape(inputs.values()[0])[-1]
+    tuning = host_tuning()
+    if workers is None:
+        workers = choose_workers(nCols, tuning)
+    if chunkSize is None:
+        chunkSize = choose_chunk_size(nCols, workers, tuning)
+    chunkSize = -(-chunkSize // align) * align
+
+    if pool is None and (workers == 1 or chunkSize >= nCols):
+        # not worth starting a process or thread
+        return kernel(args, inputs)
+
+    if executor == 'threads':
+        return _map_threads(kernel, args, inputs, nOut, workers, chunkSize)
+
+    shared = {}
+    out = None
+    ownPool = None
+    try:
+        for name, data in inputs.items():
+            shared[name] = share(data)
+        out = SharedArray((nOut, nCols))
+
+        inDescs = dict((name, s.desc()) for name, s in shared.items())
+        tasks = [ (kernel, args, inDescs, out.desc(), start, end)
+                  for start, end in chunk_bounds(nCols, chunkSize) ]
+
+        if pool is None:
+            pool = ownPool = WorkerPool(workers)
+        for _ in pool.pool.imap_unordered(_run_chunk, tasks):
+            pass
+
+        return out.array
+
+    finally:
+        if ownPool is not None:
+            ownPool.close()
+        for s in shared.values():
+            s.unlink()
+        if out is not None:
+            out.unlink()
+
+
+def map_tasks(func, tasks, workers=None, pool=None, executor='processes'):
+    '''Call func(task) for every task in parallel, e.g. one task per file,
+    and return the results in the order of the tasks.
+
+    func     - (for processes, picklable module level) function
+    tasks    - list of picklable arguments
+    workers  - number of worker processes or threads, ignored when running
+               on an existing pool. By default one per available CPU, up to
+               the number of tasks.
+    pool     - WorkerPool to run on, see map_columns
+    executor - 'processes' or 'threads'
+    '''
+    if executor not in ('processes', 'threads'):
+        raise ValueError('Unknown executor %r' % executor)
+
+    if pool is None and executor == 'processes':
+        pool = _session
+    if pool is not None:
+        workers = pool.workers
+    if workers is None:
+        workers = min(available_cpus(), len(tasks))
+
+    if pool is None and (workers <= 1 or len(tasks) <= 1):
+        # not worth starting a process or thread
+        return [ func(task) for task in tasks ]
+
+    if executor == 'threads':
+        threadPool = ThreadPool(workers)
+        try:
+            return threadPool.map(func, tasks, 1)
+        finally:
+            threadPool.close()
+            threadPool.join()
+
+    ownPool = None
+    try:
+        if pool is None:
+            pool = ownPool = WorkerPool(workers)
+        results = pool.pool.map(func, tasks, 1)
+    except BaseException:
+        if ownPool is not None:
+            ownPool.terminate()
+            ownPool = None
+        raise
+    finally:
+        if ownPool is not None:
+            ownPool.close()
+
+    return results
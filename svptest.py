@@ -0,0 +1,56 @@
+#!/home/bmurray/svn/ShellB3/trunk/ShellB3/bin/python
+'''
+Script used to check the error of the table-driven saturation vapor pressure
+against the exact formula
+
+@author: bmurray
+'''
+
+import sys
+import numpy as np
+import thermo
+
+# temperatures checked per table step, including the table nodes
+SAMPLES_PER_STEP = 10
+
+def main():
+    nSteps = thermo._svp_table_size - 1
+    temps = np.linspace(thermo.SVP_TABLE_TMIN, thermo.SVP_TABLE_TMAX,
+                        nSteps * SAMPLES_PER_STEP + 1)
+
+    exact = thermo.svp(temps)
+    fast = thermo.svp(temps, fast=True)
+    relErr = np.abs(fast - exact) / exact
+
+    worst = relErr.argmax()
+    print 'Checked %d temperatures in [%.2f, %.2f] K' % \
+        (len(temps), thermo.SVP_TABLE_TMIN, thermo.SVP_TABLE_TMAX)
+    print 'Max relative error: %.3e at %.3f K (bound %.1e)' % \
+        (relErr[worst], temps[worst], thermo.SVP_TABLE_MAX_REL_ERROR)
+
+    # outside the table, the fast mode falls back on the formula
+    outside = np.array([100.0, thermo.SVP_TABLE_TMIN - 0.001, thermo.SVP_TABLE_TMAX + 0.001, 400.0])
+    if not np.array_equal(thermo.svp(outside, fast=True), thermo.svp(outside)):
+        print 'FAILED: fast svp does not match the formula outside the table'
+        sys.exit(1)
+
+    # scalars and 0-d arrays, inside and outside of the table and NaN, keep
+    # their shape and match the formula as closely as arrays do
+    for t in [thermo.SVP_TABLE_TMIN + 10.005, 273.16, 100.0, 400.0, np.nan]:
+        for value in [t, np.float64(t), np.array(t)]:
+            exact = thermo.svp(value)
+            fast = thermo.svp(value, fast=True)
+            if np.shape(fast) != np.shape(exact) or np.isnan(fast) != np.isnan(exact) or \
+               (not np.isnan(exact) and abs(fast - exact) > thermo.SVP_TABLE_MAX_REL_ERROR * exact):
+                print 'FAILED: fast svp of %r gives %r, the formula %r' % (value, fast, exact)
+                sys.exit(1)
+
+    if relErr[worst] > thermo.SVP_TABLE_MAX_REL_ERROR:
+        print 'FAILED: fast svp exceeds its documented error bound'
+        sys.exit(1)
+
+    print 'OK'
+
+
+if __name__ == '__main__':
+    main()
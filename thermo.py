@@ -10,15 +10,14 @@ Edited to work on numpy arrays.
 
 from scipy import log10
 import numpy as np
-import math
 
 
-def rh_to_mr(rh, p, t):
+def rh_to_mr(rh, p, t, fast=False):
   '''
   Returns mixing ratio, in g/kg, given relative humidity in %,
-  pressure in hPa and temperature in K.
+  pressure in hPa and temperature in K. See svp for fast.
   '''
-  return rh * 0.01 * satmix(p, t)
+  return rh * 0.01 * satmix(p, t, fast)
 
 def rh_to_mr_wat( rh, p, t) :
   '''
@@ -34,12 +33,12 @@ def rh_to_mr_ice( rh, p, t) :
   '''
   return rh * 0.01 * satmixice(p, t)
 
-def mr_to_rh( mr,  p,  t) :
+def mr_to_rh( mr,  p,  t, fast=False) :
   '''
   Returns relative humidity in %, given the mixing ratio in g/kg,  
-  pressure in hPa and temperature in K.
+  pressure in hPa and temperature in K. See svp for fast.
   '''
-  return mr * 100. / satmix(p, t)
+  return mr * 100. / satmix(p, t, fast)
 
 def mr_to_rh_wat( mr,  p,  t) :
   '''
@@ -55,24 +54,12 @@ def mr_to_rh_ice( mr,  p,  t) :
   '''
   return mr * 100. / satmixice(p, t)
 
-def satmix( p, t) :
+def satmix( p, t, fast=False) :
   '''
   Returns saturation mixing ratio in g/kg, given pressure in hPa and
-  temperature in K.
+  temperature in K. The water, mixed or ice phase is selected by svp.
   '''
-  twat = t.astype(np.float)
-  tice = t.astype(np.float)
-  
-  twat[twat <= 253.0] = np.nan
-  tice[tice >  253.0] = np.nan
-
-  satmixw = satmixwat(p, twat)
-  satmixi = satmixice(p, tice)
-  
-  satmixw[np.isnan(satmixw)] = 0
-  satmixi[np.isnan(satmixi)] = 0
-
-  return (satmixw + satmixi)
+  return (622. * svp(t, fast)) / p
 
 
 def satmixwat( p,  t) :
@@ -109,31 +96,71 @@ def svpwat(t) :
     a8 =  0.1111201803e-16
     a9 = -0.3099457145e-19
     b = 0.61078e+1
-    t -= 273.16
+    t = t - 273.16
     return (b / ((a0+t*(a1+t*(a2+t*(a3+t*(a4+t*(a5+t*(a6+t*(a7+t*(a8+t*a9)))))))))**8.)) 
 
-def svp(t):
-    if np.isnan(t):
-        return t
+def svp(t, fast=False):
+    '''
+    Returns saturation vapor pressure in hPa, given temperature in K (scalar
+    or array of any shape), over water above the triple point, over ice below
+    250.16 K, and blended in between. Modeled after ppv.f
+
+    With fast=True, temperatures between SVP_TABLE_TMIN and SVP_TABLE_TMAX are
+    linearly interpolated in a precomputed table instead, with a relative
+    error of at most SVP_TABLE_MAX_REL_ERROR.
+    '''
+    if fast:
+        return _svp_table_lookup(t)
+
+    t = np.asarray(t, dtype=np.float64)
 
     e00 = 611.21
     t00 = 273.16
     ti  = t00 - 23.
 
-    esw = e00 * math.exp(17.502 * (t - t00) / (t-32.19))
-    esi = e00 * math.exp(22.587 * (t - t00) / (t+0.7))
+    esw = e00 * np.exp(17.502 * (t - t00) / (t-32.19))
+    esi = e00 * np.exp(22.587 * (t - t00) / (t+0.7))
 
-    ppv = None
-    if t > t00:
-        ppv = esw                                          # water phase 
-    elif t > ti and t <= t00:
-        ppv = esi + (esw - esi)*((t - ti)/(t00 - ti))**2   # mixed phase
-    elif t <= ti:
-        ppv = esi                                          # ice phase 
+    with np.errstate(invalid='ignore'):   # NaN temperatures stay NaN
+        ppv = np.where(t > t00, esw,                                    # water phase
+              np.where(t > ti, esi + (esw - esi)*((t - ti)/(t00 - ti))**2, # mixed phase
+                       esi))                                            # ice phase
 
     ppv = ppv / 100.0                     # conversion from [pascal] to [mb]
 
-    return ppv
+    return ppv[()]
+
+
+# Lookup table for svp(t, fast=True). The phase boundaries (250.16 and
+# 273.16 K) fall on table nodes, so the table is smooth between nodes.
+SVP_TABLE_TMIN = 150.0
+SVP_TABLE_TMAX = 350.0
+SVP_TABLE_STEP = 0.01
+SVP_TABLE_MAX_REL_ERROR = 1.0e-6
+
+_svp_table_size = int(round((SVP_TABLE_TMAX - SVP_TABLE_TMIN) / SVP_TABLE_STEP)) + 1
+_svp_table = svp(SVP_TABLE_TMIN + SVP_TABLE_STEP * np.arange(_svp_table_size))
+_svp_table_diff = np.diff(_svp_table)
+
+def _svp_table_lookup(t):
+    t = np.asarray(t, dtype=np.float64)
+    shape = t.shape
+    # at least 1-d, so the fallback below can assign into scalars too
+    t = np.atleast_1d(t)
+
+    x = (t - SVP_TABLE_TMIN) * (1.0 / SVP_TABLE_STEP)
+    with np.errstate(invalid='ignore'):
+        inside = (x >= 0) & (x <= _svp_table_size - 1)
+    x = np.where(inside, x, 0.)
+
+    i = np.minimum(x.astype(np.intp), _svp_table_size - 2)
+    ppv = _svp_table[i] + (x - i) * _svp_table_diff[i]
+
+    # fall back on the formula outside of the table (and for NaNs)
+    if not inside.all():
+        ppv[~inside] = svp(t[~inside])
+
+    return ppv.reshape(shape)[()]
 
 
 def svpice( t) :